@@ -47,115 +47,138 @@ class AmenitiesGenerator:
             'super_luxo': 'class_descending'
         }
 
+        # Fragmentos pré-codificados (por estilo/vibe/mês) e links que só dependem do destino
+        self.templates = LinkTemplates(self)
+
     def _clean(self, text):
         return urllib.parse.quote_plus(text)
 
-    def generate_concierge_links(self, destination, style, start_date=None, days=0, vibe="tourist_mix"):
-        """
-        Gera links monetizados (Booking, Viator) se os IDs estiverem no config.py.
-        Mantém o handover completo de Datas, Destino e Vibe.
-        """
-        
+    def _keys(self, style, vibe):
         # Sanitização
         style_key = style.lower()
         if "super" in style_key: style_key = "super_luxo"
         elif "econ" in style_key: style_key = "econômico"
         
         vibe_key = vibe if vibe in self.VIBE_FOOD_TERMS else 'tourist_mix' 
+        return style_key, vibe_key
 
-        # A. Datas (Essencial para o handover)
-        date_params_bk = "" # Para Booking
-        date_str = ""       # Para Google
-        if start_date:
-            meses = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"]
-            try: date_str = f"{meses[start_date.month-1]} {start_date.year}"
-            except: pass
-            if days > 0:
-                end_date = start_date + timedelta(days=days)
-                # Booking usa formato YYYY-MM-DD
-                date_params_bk = f"&checkin={start_date}&checkout={end_date}"
+    def generate_concierge_links(self, destination, style, start_date=None, days=0, vibe="tourist_mix"):
+        """
+        Gera links monetizados (Booking, Viator) se os IDs estiverem no config.py.
+        Mantém o handover completo de Datas, Destino e Vibe.
+        """
+        style_key, vibe_key = self._keys(style, vibe)
+        dest_links = self.templates.destination_links(destination)
+        return self.templates.render(dest_links, style_key, vibe_key, start_date, days)
 
-        # --- GERAÇÃO DOS LINKS ---
 
-        # 1. VOOS (Mantemos Google Search para melhor UX sem origem)
-        flight_url = f"https://www.google.com/search?q=passagens+aereas+para+{self._clean(destination)}"
-        
-        # 2. HOTEL (Booking Monetizado)
-        booking_order = self.BOOKING_ORDER.get(style_key, 'review_score_and_price')
-        hotel_base = f"https://www.booking.com/searchresults.pt-br.html?ss={self._clean(destination)}{date_params_bk}&order={booking_order}"
-        
-        if config.BOOKING_AID:
-            hotel_url = f"{hotel_base}&aid={config.BOOKING_AID}"
+_q = urllib.parse.quote_plus
+
+MESES = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"]
+
+
+class LinkTemplates:
+    """
+    URLs do concierge montadas a partir de pedaços já codificados.
+    quote_plus codifica caractere a caractere, então quote_plus(a + b) == quote_plus(a) + quote_plus(b):
+    cada termo fixo é codificado uma vez e o destino uma vez por destino (destination_links).
+    """
+
+    def __init__(self, gen):
+        self.gen = gen
+        self._styles = {}
+        self._vibes = {}
+        self._months = {}
+
+        # Afiliados (lidos do config.py na montagem)
+        self.booking_suffix = f"&aid={config.BOOKING_AID}" if config.BOOKING_AID else ""
+        if config.VIATOR_PID:
+            self.viator_suffix = f"&pid={config.VIATOR_PID}&aid={config.VIATOR_AID if hasattr(config, 'VIATOR_AID') else ''}&subId={config.VIATOR_SUBID}"
         else:
-            hotel_url = hotel_base
-        
-        # 3. GASTRONOMIA (Google Maps - Sem afiliação direta, foco em utilidade)
-        food_style = self.STYLE_TERMS.get(style_key, "Restaurantes")
-        food_vibe = self.VIBE_FOOD_TERMS.get(vibe_key, "")
-        food_query = f"{food_style} em {destination} {food_vibe}"
-        food_url = f"https://www.google.com/maps/search/{self._clean(food_query)}"
-        
-        food_label = "Gastronomia"
-        if vibe_key == 'business': food_label = "Almoço Executivo"
-        
-        # 4. SEGURO (Seguros Promo ou Google)
+            self.viator_suffix = ""
         if config.SEGUROS_PROMO_CODE:
             # Envia para a home com o cookie de afiliado (UX segura)
-            insurance_url = f"https://www.segurospromo.com.br/?promo={config.SEGUROS_PROMO_CODE}"
+            self.insurance_url = f"https://www.segurospromo.com.br/?promo={config.SEGUROS_PROMO_CODE}"
         else:
-            insurance_url = "https://www.google.com/search?q=seguro+viagem+cotacao"
+            self.insurance_url = "https://www.google.com/search?q=seguro+viagem+cotacao"
+
+    def _style(self, style_key):
+        parts = self._styles.get(style_key)
+        if parts is None:
+            gen = self.gen
+            parts = self._styles[style_key] = {
+                'booking_order': gen.BOOKING_ORDER.get(style_key, 'review_score_and_price'),
+                'food': _q(gen.STYLE_TERMS.get(style_key, "Restaurantes") + " em "),
+                'shop': "https://www.google.com/maps/search/" + _q(gen.SHOPPING_TERMS.get(style_key, "Shopping") + ' em '),
+            }
+        return parts
+
+    def _vibe(self, vibe_key):
+        parts = self._vibes.get(vibe_key)
+        if parts is None:
+            business = vibe_key == 'business'
+            event_query = "feiras de negocios congressos expo" if business else "agenda cultural eventos"
+            parts = self._vibes[vibe_key] = {
+                'food': _q(" " + self.gen.VIBE_FOOD_TERMS.get(vibe_key, "")),
+                'food_label': "Almoço Executivo" if business else "Gastronomia",
+                'event': f"https://www.google.com/search?q={_q(event_query)}+",
+                'event_label': "Feiras & Expo" if business else "Agenda Local",
+                'business': business,
+            }
+        return parts
+
+    def _month(self, start_date):
+        key = (start_date.year, start_date.month)
+        date_q = self._months.get(key)
+        if date_q is None:
+            date_q = self._months[key] = _q(f"{MESES[start_date.month - 1]} {start_date.year}")
+        return date_q
+
+    def destination_links(self, destination):
+        """Links e codificações que só dependem do destino (voos, Viator, coworking)."""
+        d = _q(destination)
+        viator = f"https://www.viator.com/searchResults/all?text={d}+"
+        return {
+            'q': d,
+            'flight': f"https://www.google.com/search?q=passagens+aereas+para+{d}",
+            'night': viator + _q("nightlife pub crawl") + self.viator_suffix,
+            'culture': viator + _q("museum tickets historical tours") + self.viator_suffix,
+            'nature': viator + _q("outdoor activities parks hiking") + self.viator_suffix,
+            'attractions': viator + _q("top attractions skip the line") + self.viator_suffix,
+            # Business linka para Google Maps "Coworking" (utilidade) em vez da Viator
+            'coworking': f"https://www.google.com/maps/search/{_q('Coworking cafes com wifi em ')}{d}",
+        }
 
-        # 5. VARIÁVEIS (Concierge com Viator Monetizado)
-        
-        # Função auxiliar para gerar link Viator ou Google (Fallback)
-        def get_activity_link(query_text, google_fallback_query):
-            if config.VIATOR_PID:
-                # Busca deep link na Viator com os parâmetros de afiliado
-                base = f"https://www.viator.com/searchResults/all?text={self._clean(destination + ' ' + query_text)}"
-                return f"{base}&pid={config.VIATOR_PID}&aid={config.VIATOR_AID if hasattr(config, 'VIATOR_AID') else ''}&subId={config.VIATOR_SUBID}"
-            else:
-                return f"https://www.viator.com/searchResults/all?text={self._clean(destination + ' ' + query_text)}"
-
-        # Compras (Mantém Google Maps)
-        shop_term = self.SHOPPING_TERMS.get(style_key, "Shopping")
-        shop_url = f"https://www.google.com/maps/search/{self._clean(shop_term + ' em ' + destination)}"
-
-        # Vida Noturna
-        night_url = get_activity_link("nightlife pub crawl", "nightlife")
-
-        # Arte & Cultura
-        cult_url = get_activity_link("museum tickets historical tours", "museums")
-
-        # Natureza
-        nature_url = get_activity_link("outdoor activities parks hiking", "parks")
-        
-        # Agenda / Feiras (Mantém Google Search)
-        event_query = "agenda cultural eventos"
-        if vibe_key == 'business': event_query = "feiras de negocios congressos expo"
-        event_url = f"https://www.google.com/search?q={self._clean(event_query)}+{self._clean(destination)}+{self._clean(date_str)}"
-        event_label = "Agenda Local"
-        if vibe_key == 'business': event_label = "Feiras & Expo"
-
-        # Attr (Passeios ou Coworking)
-        attr_label = "Principais Atrações"
-        if vibe_key == 'business':
-            # Se for Business, linka para Google Maps "Coworking" (Utilidade)
-            attr_label = "Coworking & Cafés"
-            attr_url = f"https://www.google.com/maps/search/{self._clean('Coworking cafes com wifi em ' + destination)}"
+    def render(self, dest_links, style_key, vibe_key, start_date=None, days=0):
+        st, vb, d = self._style(style_key), self._vibe(vibe_key), dest_links['q']
+
+        # A. Datas (Essencial para o handover): Booking usa YYYY-MM-DD, Google o mês por extenso
+        date_params_bk = ""
+        date_q = ""
+        if start_date:
+            date_q = self._month(start_date)
+            if days > 0:
+                date_params_bk = f"&checkin={start_date}&checkout={start_date + timedelta(days=days)}"
+
+        hotel_url = (f"https://www.booking.com/searchresults.pt-br.html?ss={d}{date_params_bk}"
+                     f"&order={st['booking_order']}{self.booking_suffix}")
+        food_url = f"https://www.google.com/maps/search/{st['food']}{d}{vb['food']}"
+        event_url = f"{vb['event']}{d}+{date_q}"
+        if vb['business']:
+            attr_label, attr_url = "Coworking & Cafés", dest_links['coworking']
         else:
-            # Se for Lazer, linka para Viator (Monetizado)
-            attr_url = get_activity_link("top attractions skip the line", "attractions")
+            attr_label, attr_url = "Principais Atrações", dest_links['attractions']
 
         return {
-            "flight":    {"url": flight_url,    "label": "Monitorar Voos", "icon": "✈️"},
+            "flight":    {"url": dest_links['flight'], "label": "Monitorar Voos", "icon": "✈️"},
             "hotel":     {"url": hotel_url,     "label": "Ver Hotéis",     "icon": "🏨"},
-            "food":      {"url": food_url,      "label": food_label,       "icon": "🍽️"},
-            "insurance": {"url": insurance_url, "label": "Seguro Viagem",  "icon": "🛡️"},
+            "food":      {"url": food_url,      "label": vb['food_label'], "icon": "🍽️"},
+            "insurance": {"url": self.insurance_url, "label": "Seguro Viagem", "icon": "🛡️"},
             
-            "shopping":  {"url": shop_url,      "label": "Compras & Lojas", "icon": "🛍️"},
-            "night":     {"url": night_url,     "label": "Vida Noturna",   "icon": "🍸"},
-            "culture":   {"url": cult_url,      "label": "Arte & Cultura", "icon": "🏛️"},
-            "nature":    {"url": nature_url,    "label": "Ar Livre",       "icon": "🍃"},
-            "event":     {"url": event_url,     "label": event_label,      "icon": "📅"},
+            "shopping":  {"url": st['shop'] + d, "label": "Compras & Lojas", "icon": "🛍️"},
+            "night":     {"url": dest_links['night'],   "label": "Vida Noturna",   "icon": "🍸"},
+            "culture":   {"url": dest_links['culture'], "label": "Arte & Cultura", "icon": "🏛️"},
+            "nature":    {"url": dest_links['nature'],  "label": "Ar Livre",       "icon": "🍃"},
+            "event":     {"url": event_url,     "label": vb['event_label'], "icon": "📅"},
             "attr":      {"url": attr_url,      "label": attr_label,       "icon": "🎟️"} 
         }
@@ -2,6 +2,7 @@ import streamlit as st
 import engine
 import amenities
 import share
+import profiler
 from datetime import date
 import urllib.parse
 
@@ -128,107 +129,195 @@ st.markdown('<p class="flight-warning">(não inclui passagens aéreas)</p>', uns
 st.write("---")
 
 # --- ESTADO ---
+# st.session_state.quote: entradas + resultado da última cotação. As seções de resultado leem
+# só daqui (não dos widgets), então mexer no formulário depois de calcular não as invalida.
 if 'calculated' not in st.session_state:
     st.session_state.calculated = False
 
-# --- INPUTS ---
-dest = st.text_input("Para onde vamos?", placeholder="Ex: Paris, Orlando, Nordeste...")
-travel_dates = st.date_input("Período da viagem", value=[], min_value=date.today(), format="DD/MM/YYYY")
+# Perfil por amostragem só para esta sessão: ?profile=<token de admin> (config.PROFILE_ADMIN_TOKEN)
+PROFILE = profiler.admin_requested(st.query_params.get("profile"))
 
-days_calc = 0
-start_date = None
-if len(travel_dates) == 2:
-    start_date, end_date = travel_dates
-    days_calc = (end_date - start_date).days + 1
-    if days_calc < 1: days_calc = 1
-
-c1, c2 = st.columns(2)
-with c1: travelers = st.slider("Pessoas", 1, 6, 2)
-with c2: currency = st.selectbox("Moeda", ["BRL", "USD", "EUR"])
-
-style = st.select_slider("Estilo", 
-    options=["Econômico", "Moderado", "Conforto", "Luxo", "Super Luxo (Exclusivo)"], 
-    value="Moderado")
-
-vibe_display = st.selectbox("Vibe da Viagem", 
-    ["Tourist Mix (Clássico)", "Cultura (História/Arte)", "Gastro (Comer Bem)", 
-     "Natureza (Relax/Trilhas)", "Festa (Vida Noturna)", "Familiar (Com Crianças)", 
-     "Business (A Trabalho)"])
-
-vibe_map = {
+VIBE_MAP = {
     "Tourist Mix (Clássico)": "tourist_mix", "Cultura (História/Arte)": "cultura",
     "Gastro (Comer Bem)": "gastro", "Natureza (Relax/Trilhas)": "natureza",
     "Festa (Vida Noturna)": "festa", "Familiar (Com Crianças)": "familiar",
     "Business (A Trabalho)": "business"
 }
 
-# --- CÁLCULO ---
-st.write("")
-if st.button("💰 Calcular Investimento", type="primary", use_container_width=True):
-    if not dest or days_calc == 0:
-        st.warning("⚠️ Por favor, informe o destino e as datas (ida e volta).")
+CONCIERGE_OPTIONS = {
+    "Compras": "shopping", "Vida Noturna": "night", "Arte & Cultura": "culture",
+    "Natureza": "nature", "Agenda de Eventos": "event", "Atrações/Coworking": "attr"
+}
+
+def fmt(v, currency): return f"{currency} {v:,.2f}".replace(',','X').replace('.',',').replace('X','.')
+
+def place_name(key):
+    return " ".join(w if w in ("de", "do", "da", "dos", "das") else w.capitalize() for w in key.split())
+
+def link_button(item):
+    return f'<a href="{item["url"]}" target="_blank" class="monetize-btn"><span class="btn-icon">{item["icon"]}</span><span class="btn-label">{item["label"]}</span></a>'
+
+# --- FRAGMENTOS ---
+# Cada seção é um st.fragment: um widget dentro dela reroda só a própria seção (e o navegador
+# recebe só o pedaço que mudou). A página inteira só reroda ao trocar o modo ou ao calcular.
+
+# --- INPUTS + COTAÇÃO ---
+@st.fragment
+def quote_form(budget_mode):
+    dest = ""
+    budget = 0.0
+    if budget_mode:
+        budget = st.number_input("Quanto você quer gastar no total?", min_value=0.0, value=10000.0, step=500.0)
     else:
-        with st.spinner('O Concierge está fazendo as contas...'):
-            res = engine.engine.calculate_cost(dest, days_calc, travelers, style.lower(), currency, vibe_map[vibe_display], start_date)
-            st.session_state.result = res
-            st.session_state.calculated = True
+        dest = st.text_input("Para onde vamos?", placeholder="Ex: Paris, Orlando, Nordeste...", key="dest_input")
+        # Autocompletar offline (índice de trigramas): corrige "Buenos Aries", "Floripa", "Amsterdam"...
+        if dest and not engine.engine.geo.is_catalog_city(dest):
+            suggestions = engine.engine.suggest_destinations(dest, limit=3)
+            if suggestions:
+                def use_suggestion():
+                    st.session_state.dest_input = st.session_state.dest_suggestion
+                    st.session_state.dest_suggestion = None
+                st.pills("Você quis dizer:", [name for _, name, _ in suggestions], key="dest_suggestion", on_change=use_suggestion)
+    travel_dates = st.date_input("Período da viagem", value=[], min_value=date.today(), format="DD/MM/YYYY")
 
-# --- EXIBIÇÃO ---
-if st.session_state.calculated:
-    res = st.session_state.result
-    st.success("✅ Orçamento pronto!")
-    
-    # 1. Valores (COM A MUDANÇA SOLICITADA)
-    def fmt(v): return f"{currency} {v:,.2f}".replace(',','X').replace('.',',').replace('X','.')
-    st.markdown(f'<div class="price-hero">{fmt(res["daily_avg"])}</div>', unsafe_allow_html=True)
-    # Adicionado ({days_calc} diárias) discretamente
-    st.markdown(f'<div class="price-sub">por pessoa / dia ({days_calc} diárias)<br><b>Total: {fmt(res["total"])}</b></div>', unsafe_allow_html=True)
+    days_calc = 0
+    start_date = None
+    if len(travel_dates) == 2:
+        start_date, end_date = travel_dates
+        days_calc = (end_date - start_date).days + 1
+        if days_calc < 1: days_calc = 1
 
-    # 2. Ticket
+    c1, c2 = st.columns(2)
+    with c1: travelers = st.slider("Pessoas", 1, 6, 2)
+    with c2: currency = st.selectbox("Moeda", ["BRL", "USD", "EUR", "GBP", "ARS", "CLP", "MXN"])
+
+    style = st.select_slider("Estilo", 
+        options=["Econômico", "Moderado", "Conforto", "Luxo", "Super Luxo (Exclusivo)"], 
+        value="Moderado")
+
+    vibe_display = st.selectbox("Vibe da Viagem", list(VIBE_MAP))
+
+    # --- RANKING POR ORÇAMENTO ---
+    # Uma passada vetorizada sobre a base inteira (milissegundos): roda a cada interação, sem botão
+    if budget_mode:
+        st.write("")
+        if days_calc == 0 or budget <= 0:
+            st.info("Informe o orçamento e as datas (ida e volta) para ver os destinos que cabem no bolso.")
+        else:
+            rank_mode = st.radio("Ordenar por", ["Mais baratos", "Aproveitar o orçamento"], horizontal=True)
+            with profiler.profiled("ranking", force=PROFILE):
+                ranking = engine.engine.rank_destinations(
+                    budget, days_calc, travelers, style.lower(), currency, VIBE_MAP[vibe_display], start_date,
+                    seasonality="nightly", k=10, mode="cheapest" if rank_mode == "Mais baratos" else "fit")
+            if ranking["results"]:
+                st.success(f"✅ {ranking['matches']} destinos cabem em {fmt(budget, currency)}")
+                for pos, item in enumerate(ranking["results"], 1):
+                    st.markdown(f"**{pos}. {place_name(item['destination'])}** — {fmt(item['total'], currency)} "
+                                f"<span style='color:#757575'>({fmt(item['daily_avg'], currency)} por pessoa/dia)</span>",
+                                unsafe_allow_html=True)
+            elif ranking["cheapest"]:
+                cheapest = ranking["cheapest"]
+                st.warning(f"Nenhum destino cabe nesse orçamento. O mais em conta é "
+                           f"{place_name(cheapest['destination'])}, por {fmt(cheapest['total'], currency)}.")
+            if ranking.get("defaulted"):
+                st.caption("ℹ️ Algumas fontes demoraram a responder; usamos valores de referência nesta estimativa.")
+        return
+
+    # --- CÁLCULO ---
+    st.write("")
+    if st.button("💰 Calcular Investimento", type="primary", use_container_width=True):
+        if not dest or days_calc == 0:
+            st.warning("⚠️ Por favor, informe o destino e as datas (ida e volta).")
+        else:
+            with st.spinner('O Concierge está fazendo as contas...'), profiler.profiled("quote", force=PROFILE):
+                vibe = VIBE_MAP[vibe_display]
+                res = engine.engine.calculate_cost(dest, days_calc, travelers, style.lower(), currency, vibe, start_date, seasonality="nightly")
+            st.session_state.quote = {
+                "dest": dest, "days": days_calc, "travelers": travelers, "style": style.lower(),
+                "currency": currency, "vibe": vibe, "start_date": start_date, "result": res,
+            }
+            st.session_state.calculated = True
+            st.rerun()  # Cotação nova: redesenha a página com as seções de resultado
+
+# --- TICKET ---
+@st.fragment
+def ticket_section(quote):
+    res = quote["result"]
     with st.expander("📸 Baixar Resumo para Stories"):
-        ticket_img = share.TicketGenerator().create_ticket(dest, res['total'], res['daily_avg'], days_calc, vibe_map[vibe_display], currency)
-        st.download_button("💾 Download Imagem", ticket_img, file_name=f"takeitiz_{dest}.png", mime="image/png", use_container_width=True)
+        # Geração preguiçosa: o PNG só é produzido quando alguém clica em baixar (e o clique não reroda nada)
+        ticket_args = (quote["dest"], res['total'], res['daily_avg'], quote["days"], quote["vibe"], quote["currency"])
+        def ticket_png():
+            with profiler.profiled("ticket", force=PROFILE):
+                return share.TicketGenerator().create_ticket(*ticket_args).getvalue()
+        st.download_button("💾 Download Imagem", ticket_png, file_name=f"takeitiz_{quote['dest']}.png", mime="image/png", use_container_width=True, on_click="ignore")
 
-    # 3. Detalhes
+# --- DETALHES ---
+@st.fragment
+def breakdown_section(quote):
+    currency = quote["currency"]
     with st.expander("📊 Ver detalhes dos gastos"):
-        bk = res['breakdown']
+        bk = quote["result"]['breakdown']
         col_a, col_b, col_c = st.columns(3)
-        col_a.metric("Hospedagem", fmt(bk['lodging']), delta_color="off")
-        col_b.metric("Alimentação", fmt(bk['food']), delta_color="off")
-        col_c.metric("Lazer/Transp.", fmt(bk['transport'] + bk['activities'] + bk['misc']), delta_color="off")
+        col_a.metric("Hospedagem", fmt(bk['lodging'], currency), delta_color="off")
+        col_b.metric("Alimentação", fmt(bk['food'], currency), delta_color="off")
+        col_c.metric("Lazer/Transp.", fmt(bk['transport'] + bk['activities'] + bk['misc'], currency), delta_color="off")
 
-    st.write("---")
-    
-    # 4. CONCIERGE PERSONALIZADO
+# --- CONCIERGE PERSONALIZADO ---
+@st.fragment
+def concierge_section(quote):
     st.subheader("🛎️ Concierge Digital")
     
     user_choices = st.multiselect(
-        label=f"Além do básico, o que você quer curtir em {dest}?",
-        options=["Compras", "Vida Noturna", "Arte & Cultura", "Natureza", "Agenda de Eventos", "Atrações/Coworking"],
+        label=f"Além do básico, o que você quer curtir em {quote['dest']}?",
+        options=list(CONCIERGE_OPTIONS),
         default=[]
     )
 
-    links_data = amenities.AmenitiesGenerator().generate_concierge_links(dest, style.lower(), start_date, days_calc, vibe_map[vibe_display])
-    
-    html_buttons = ""
-    
-    fixed_keys = ["flight", "hotel", "food", "insurance"]
-    for key in fixed_keys:
-        item = links_data[key]
-        html_buttons += f'<a href="{item["url"]}" target="_blank" class="monetize-btn"><span class="btn-icon">{item["icon"]}</span><span class="btn-label">{item["label"]}</span></a>'
-        
-    selection_map = {
-        "Compras": "shopping", "Vida Noturna": "night", "Arte & Cultura": "culture",
-        "Natureza": "nature", "Agenda de Eventos": "event", "Atrações/Coworking": "attr"
-    }
-    
+    # Links montados uma vez por cotação; trocar os extras só junta os botões de novo
+    links_data = quote.get("links")
+    if links_data is None:
+        links_data = quote["links"] = amenities.AmenitiesGenerator().generate_concierge_links(
+            quote["dest"], quote["style"], quote["start_date"], quote["days"], quote["vibe"])
+        quote["fixed_buttons"] = "".join(link_button(links_data[key]) for key in ("flight", "hotel", "food", "insurance"))
+
+    html_buttons = quote["fixed_buttons"]
     for choice in user_choices:
-        key = selection_map.get(choice)
+        key = CONCIERGE_OPTIONS.get(choice)
         if key and key in links_data:
-            item = links_data[key]
-            html_buttons += f'<a href="{item["url"]}" target="_blank" class="monetize-btn"><span class="btn-icon">{item["icon"]}</span><span class="btn-label">{item["label"]}</span></a>'
+            html_buttons += link_button(links_data[key])
 
     st.markdown(f'<div class="monetize-grid">{html_buttons}</div>', unsafe_allow_html=True)
+
+# --- PÁGINA ---
+# Trocar o modo muda quais seções existem: fica fora dos fragmentos e reroda a página inteira
+mode = st.radio("Modo", ["📍 Já sei o destino", "💸 Tenho um orçamento"], horizontal=True, label_visibility="collapsed")
+budget_mode = mode.startswith("💸")
+
+quote_form(budget_mode)
+
+# --- EXIBIÇÃO ---
+if st.session_state.calculated and not budget_mode:
+    quote = st.session_state.quote
+    res = quote["result"]
+    st.success("✅ Orçamento pronto!")
+    if res.get("defaulted"):
+        st.caption("ℹ️ Algumas fontes demoraram a responder; usamos valores de referência nesta estimativa.")
+    
+    # 1. Valores (COM A MUDANÇA SOLICITADA)
+    st.markdown(f'<div class="price-hero">{fmt(res["daily_avg"], quote["currency"])}</div>', unsafe_allow_html=True)
+    # Adicionado ({days} diárias) discretamente
+    st.markdown(f'<div class="price-sub">por pessoa / dia ({quote["days"]} diárias)<br><b>Total: {fmt(res["total"], quote["currency"])}</b></div>', unsafe_allow_html=True)
+
+    # 2. Ticket
+    ticket_section(quote)
+
+    # 3. Detalhes
+    breakdown_section(quote)
+
+    st.write("---")
+    
+    # 4. Concierge
+    concierge_section(quote)
     
     with st.expander("ℹ️ Metodologia"):
         st.write("Cálculos baseados em dados proprietários calibrados manualmente para o perfil brasileiro.")
@@ -0,0 +1,169 @@
+# autocomplete.py
+# Índice de destinos tolerante a erros de digitação (trigramas + distância de edição), em memória.
+# "Amsterdam", "Buenos Aries", "florianopols" ou "sao paolo" viram cidade da base sem ir ao Nominatim.
+# Montado a partir do snapshot da base (chaves, apelidos e nomes de exibição); consulta em microssegundos.
+
+import re
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+import config
+import telemetry
+from matcher import normalize
+
+_SPACES = re.compile(r"\s+")
+_PUNCT = re.compile(r"[^a-z0-9 ]+")
+
+
+def clean(text):
+    """Normaliza para indexar/consultar: sem acento, minúsculo, sem pontuação, espaços simples."""
+    return _SPACES.sub(" ", _PUNCT.sub(" ", normalize(text))).strip()
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Distância de Damerau (transposição adjacente conta 1). Para cedo se passar de `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def max_typos(length):
+    # Estrito: nomes curtos ("bali", "pipa") só por igualdade; 1 erro até 8 letras, 2 acima
+    if length < 5:
+        return 0
+    return 1 if length <= 8 else 2
+
+
+class DestinationIndex:
+    """
+    suggest(texto)     -> [(chave, nome, score)] para autocompletar (prefixo + trigramas).
+    best_match(texto)  -> (chave, dados, trecho) quando há UMA cidade a poucos erros de distância.
+    Apelidos apontam para a cidade principal; cada cidade aparece uma vez nas sugestões.
+    """
+
+    MIN_DICE = 0.3    # candidatos: trigramas em comum
+    MIN_SCORE = 0.45  # sugestões abaixo disso são ruído ("buenos ai" -> "búzios")
+
+    def __init__(self, cities):
+        self.cities = cities
+        self.terms = []      # termo normalizado
+        self.owners = []     # chave principal dona do termo
+        self.names = {}      # chave principal -> nome de exibição
+        grams = defaultdict(list)
+        seen = set()
+        for key, data in cities.items():
+            owner = data.get('alias_of') or key
+            self.names.setdefault(owner, data.get('name') or key)
+            for term in (clean(key), clean(data.get('name') or '')):
+                if not term or (term, owner) in seen:
+                    continue
+                seen.add((term, owner))
+                tid = len(self.terms)
+                self.terms.append(term)
+                self.owners.append(owner)
+                for g in trigrams(term):
+                    grams[g].append(tid)
+        self._grams = dict(grams)
+        self._gram_count = [len(trigrams(t)) for t in self.terms]
+        self._sorted = sorted((t, i) for i, t in enumerate(self.terms))
+
+    def _candidates(self, q):
+        """{term_id: coeficiente de Dice} dos termos que dividem trigramas com a consulta."""
+        q_grams = trigrams(q)
+        shared = defaultdict(int)
+        for g in q_grams:
+            for tid in self._grams.get(g, ()):
+                shared[tid] += 1
+        n = len(q_grams)
+        return {tid: 2.0 * c / (n + self._gram_count[tid]) for tid, c in shared.items()}
+
+    def _prefixed(self, q):
+        i = bisect_left(self._sorted, (q, -1))
+        while i < len(self._sorted) and self._sorted[i][0].startswith(q):
+            yield self._sorted[i][1]
+            i += 1
+
+    def suggest(self, text, limit=None, budget_ms=None):
+        limit = limit or config.AUTOCOMPLETE_LIMIT
+        budget = (budget_ms or config.AUTOCOMPLETE_BUDGET_MS) / 1000.0
+        t0 = time.perf_counter()
+        q = clean(text)
+        if len(q) < 2:
+            return []
+
+        best = {}  # dono -> score
+
+        def offer(tid, score):
+            owner = self.owners[tid]
+            if score > best.get(owner, 0.0):
+                best[owner] = score
+
+        # 1. Prefixo (digitando): quanto mais do nome já foi digitado, maior o score
+        for tid in self._prefixed(q):
+            offer(tid, 1.0 + len(q) / len(self.terms[tid]))
+
+        # 2. Trigramas (erros de digitação); os mais parecidos primeiro, dentro do orçamento
+        limit_typos = max_typos(len(q))
+        ranked = sorted(self._candidates(q).items(), key=lambda kv: -kv[1])
+        for n, (tid, dice) in enumerate(ranked):
+            if dice < self.MIN_DICE:
+                break
+            score = dice
+            if limit_typos:
+                dist = edit_distance(q, self.terms[tid], limit_typos)
+                if dist <= limit_typos:
+                    score = max(score, 1.0 - dist / (len(q) + 1))
+            offer(tid, score)
+            if n % 16 == 15 and time.perf_counter() - t0 > budget:
+                telemetry.count('takeitiz_autocomplete_total', result='budget_exceeded')
+                break
+
+        out = sorted(((k, v) for k, v in best.items() if v >= self.MIN_SCORE),
+                     key=lambda kv: (-kv[1], len(self.names[kv[0]])))[:limit]
+        telemetry.REGISTRY.observe('takeitiz_stage_seconds', time.perf_counter() - t0, stage='autocomplete')
+        return [(key, self.names[key], round(score, 3)) for key, score in out]
+
+    def best_match(self, dest_clean):
+        """
+        Casamento tolerante para a cotação: o texto inteiro, ou o trecho antes da vírgula
+        ("Buenos Aries, Argentina"), a até max_typos() erros de UMA única cidade. Empate -> None.
+        """
+        segments = [clean(dest_clean)]
+        if "," in dest_clean:
+            segments.append(clean(dest_clean.split(",", 1)[0]))
+        for q in segments:
+            limit_typos = max_typos(len(q))
+            if not limit_typos:
+                continue
+            found = {}
+            for tid, dice in self._candidates(q).items():
+                if dice < self.MIN_DICE:
+                    continue
+                dist = edit_distance(q, self.terms[tid], limit_typos)
+                if dist <= limit_typos:
+                    owner = self.owners[tid]
+                    found[owner] = min(dist, found.get(owner, dist))
+            if not found:
+                continue
+            top = min(found.values())
+            winners = [owner for owner, dist in found.items() if dist == top]
+            if len(winners) == 1:
+                return winners[0], self.cities[winners[0]], q
+        return None
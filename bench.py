@@ -0,0 +1,411 @@
+# bench.py
+# Micro-benchmarks offline do pipeline de cotação.
+# yfinance, awesomeapi e Nominatim são trocados por dublês locais determinísticos.
+#
+# Uso:
+#   python bench.py                         # roda e compara com bench_baseline.json (se existir)
+#   python bench.py --save-baseline         # grava a linha de base desta máquina
+#   python bench.py --margin 0.30 -n 500    # tolera 30% de regressão no p50
+#   python bench.py --only engine           # filtra cenários pelo nome
+#   python bench.py --stress 32             # 32 threads concorrentes: resultados idênticos, sem "database is locked"
+#   python bench.py --check-tickets         # ticket com camadas em cache == desenho original, pixel a pixel
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from datetime import date
+
+import config
+
+DEFAULT_BASELINE = "bench_baseline.json"
+
+STUB_FX = {"BRL=X": 5.40, "EUR=X": 1 / 1.08, "GBP=X": 0.79, "ARS=X": 1020.0, "CLP=X": 940.0, "MXN=X": 18.3}
+
+
+# --- 1. DUBLÊS OFFLINE ---
+class _Frame:
+    """O bastante de um DataFrame do yf.download: frame['Close'].ffill().iloc[-1].get(símbolo)."""
+    def __init__(self, last):
+        self.iloc = [last]
+
+    def __getitem__(self, field):
+        return self
+
+    def ffill(self):
+        return self
+
+def _download(symbols, **kwargs):
+    return _Frame({s: STUB_FX[s] for s in symbols if s in STUB_FX})
+
+class _Location:
+    def __init__(self, country_code, state=""):
+        self.raw = {'address': {'country_code': country_code, 'state': state}}
+
+def _stub_geocode(query, **kwargs):
+    # Determinístico: o país sai do hash do texto
+    countries = ['br', 'us', 'fr', 'it', 'ar', 'jp']
+    return _Location(countries[sum(map(ord, query)) % len(countries)])
+
+class _Response:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {f"USD{symbol[:3]}": {"ask": str(rate)} for symbol, rate in STUB_FX.items()}
+
+def install_stubs():
+    """Deve rodar antes de importar engine: nenhuma chamada sai da máquina."""
+    sys.modules['yfinance'] = types.SimpleNamespace(download=_download)
+    config.CACHE_BACKEND = "sqlite"
+    config.CACHE_SQLITE_PATH = os.path.join(tempfile.mkdtemp(prefix="takeitiz-bench-"), "l2.sqlite")
+
+    import requests
+    requests.get = lambda *a, **k: _Response()
+
+    import engine
+    import geocache
+    engine.engine.geo.geolocator.geocode = _stub_geocode
+    # Sem limitador de 1 req/s: o dublê responde na hora
+    engine.engine.geo.geocache.limiter = geocache.TokenBucket(rate=1e9, capacity=1e9)
+    # Aquece a cesta de câmbio pelo caminho normal (uma coleta para todas as moedas)
+    engine.engine.fx.store.cold_wait = 5.0
+    engine.engine.fx.get_rate("BRL")
+    return engine
+
+
+# --- 2. CENÁRIOS ---
+def build_scenarios(engine):
+    import amenities
+    import pricegrid
+    import share
+
+    eng = engine.engine
+    geo = eng.geo
+    trip = date(2026, 7, 10)
+    counter = iter(range(10 ** 9))
+
+    # Catálogo sintético de 5 mil cidades: o ranking tem que continuar na casa dos milissegundos
+    profiles = list(geo.SEASONALITY_MATRIX)
+    big_catalog = {
+        f"cidade {i}": {"idx": 60 + i % 150, "profile": profiles[i % len(profiles)], "modifiers": {"lodging": 1 + (i % 7) / 10}}
+        for i in range(5000)
+    }
+    big_grid = pricegrid.PriceGrid(adr_fn=eng.hotel.estimate_adr, **dict(eng._model_inputs(), cities=big_catalog))
+
+    def uncached(fn):
+        # Mede o caminho completo, sem o memo de orçamentos
+        def run():
+            eng.quote_cache.clear()
+            return fn()
+        return run
+
+    scenarios = {
+        "engine.calculate_cost[city]": uncached(lambda: eng.calculate_cost("Paris", 7, 2, "moderado", "BRL", "cultura", trip, "nightly")),
+        "engine.calculate_cost[substring]": uncached(lambda: eng.calculate_cost("Hotel em Buenos Aires centro", 7, 2, "conforto", "EUR", "gastro", trip)),
+        "engine.calculate_cost[geocode]": uncached(lambda: eng.calculate_cost(f"Vilarejo {next(counter)}", 7, 2, "moderado", "USD", "natureza", trip)),
+        "engine.calculate_cost[memo]": lambda: eng.calculate_cost("Paris", 7, 2, "moderado", "BRL", "cultura", trip, "nightly"),
+        "engine.calculate_cost[long_stay]": uncached(lambda: eng.calculate_cost("Lisboa", 180, 4, "luxo", "EUR", "familiar", trip, "smooth")),
+        "engine.price_grid.build": lambda: eng.grid.refresh(force=True),
+        "fx.get_quote[ARS]": lambda: eng.fx.get_quote("ARS"),
+        "fx.get_cross_rate[ARS->BRL]": lambda: eng.fx.get_cross_rate("ARS", "BRL"),
+        "engine.rank_destinations[catalog]": lambda: eng.rank_destinations(15000, 7, 2, "moderado", "BRL", "cultura", trip, "nightly"),
+        "engine.rank_destinations[5k]": lambda: eng.rank_destinations(20000, 7, 2, "conforto", "EUR", "gastro", trip, "smooth", grid=big_grid),
+        "geo.get_data[city]": lambda: geo.get_data("Florianópolis"),
+        "geo.get_data[substring]": lambda: geo.get_data("Fim de semana em Campos do Jordão"),
+        "geo.get_data[gazetteer]": lambda: geo.get_data("Toscana, Itália"),
+        "geo.get_data[fuzzy]": lambda: geo.get_data("Buenos Aries, Argentina"),
+        "autocomplete.suggest[prefix]": lambda: eng.suggest_destinations("flor"),
+        "autocomplete.suggest[typo]": lambda: eng.suggest_destinations("Lençois Maranenses"),
+        "geo.get_data[geocode_cached]": lambda: geo.get_data("Vilarejo Fixo"),
+        "geo.get_data[geocode_miss]": lambda: geo.get_data(f"Aldeia {next(counter)}"),
+        "share.render_png": lambda: share.TicketGenerator().render_png("Fernando de Noronha", 12345.67, 456.78, 7, "gastro", "BRL"),
+        "share.create_ticket[cached]": lambda: share.TicketGenerator().create_ticket("Paris", 9876.54, 705.47, 7, "cultura", "EUR"),
+    }
+
+    ticket = share.TicketGenerator()
+    ticket_img = ticket.render_image("Fernando de Noronha", 12345.67, 456.78, 7, "gastro", "BRL")
+    for fmt in share.FORMATS:
+        scenarios[f"share.encode[{fmt}]"] = lambda f=fmt: ticket.encode(ticket_img, f)
+
+    gen = amenities.AmenitiesGenerator()
+    for style in engine.StyleConfig.SETTINGS:
+        for vibe in engine.VibeConfig.MULTIPLIERS:
+            scenarios[f"amenities.links[{style}/{vibe}]"] = (
+                lambda s=style, v=vibe: gen.generate_concierge_links("Rio de Janeiro", s, trip, 7, v)
+            )
+    return scenarios
+
+
+# --- 3. MEDIÇÃO ---
+def measure(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - t0) / 1000.0)
+
+    # Alocações medidas numa passada separada (tracemalloc distorce o tempo)
+    alloc_runs = max(1, min(iterations, 50))
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    for _ in range(alloc_runs):
+        fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    diff = after.compare_to(before, 'filename')
+    allocated = sum(max(d.size_diff, 0) for d in diff)
+    blocks = sum(max(d.count_diff, 0) for d in diff)
+
+    samples.sort()
+    q = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+    return {
+        "min_us": samples[0],
+        "p50_us": q[49],
+        "p95_us": q[94],
+        "p99_us": q[98],
+        "max_us": samples[-1],
+        "mean_us": statistics.fmean(samples),
+        "retained_bytes_per_call": allocated / alloc_runs,
+        "retained_blocks_per_call": blocks / alloc_runs,
+        "peak_bytes": peak,
+    }
+
+
+# --- 4. ESTRESSE CONCORRENTE ---
+class _LockWatcher(logging.Handler):
+    """Captura qualquer log com "database is locked" (SQLite disputado entre threads)."""
+
+    def __init__(self):
+        super().__init__()
+        self.hits = []
+
+    def emit(self, record):
+        msg = record.getMessage()
+        if record.exc_info and record.exc_info[1] is not None:
+            msg += f" {record.exc_info[1]}"
+        if "locked" in msg.lower():
+            self.hits.append(msg)
+
+
+def _fingerprint(res):
+    bk = res["breakdown"]
+    return (
+        round(res["total"], 6),
+        round(res["daily_avg"], 6),
+        tuple(sorted((k, round(float(v), 6)) for k, v in bk.items() if k != "lodging_nightly")),
+        tuple(round(float(v), 6) for v in bk["lodging_nightly"]),
+        tuple(res["defaulted"]),
+    )
+
+
+def stress(engine, threads, quotes_per_thread):
+    import cache
+    import geocache
+
+    eng = engine.engine
+    trip = date(2026, 12, 20)
+    destinations = ["Paris", "Lisboa, Portugal", "Toscana", "Nordeste", "Rio de Janeiro", "Bariloche"]
+    destinations += [f"Vilarejo Estresse {i}" for i in range(40)]
+    workload = [
+        (dest, days, trav, style, cur, vibe, trip, season)
+        for dest in destinations
+        for days, trav in ((3, 1), (10, 4))
+        for style in ("econômico", "luxo")
+        for cur in ("BRL", "EUR", "USD")
+        for vibe in ("festa", "business")
+        for season in ("start", "nightly")
+    ]
+
+    # Referência sequencial
+    reference = {args: _fingerprint(eng.calculate_cost(*args, deadline=30)) for args in workload}
+
+    # Fase concorrente: caches frios para disputar SQLite, single-flight e memo ao mesmo tempo
+    eng.quote_cache.clear()
+    fresh = cache.SQLiteBackend(os.path.join(tempfile.mkdtemp(prefix="takeitiz-stress-"), "l2.sqlite"))
+    eng.geo.geocache = geocache.GeocodeCache(store=cache.TieredCache('geocode', backend=fresh),
+                                             limiter=geocache.TokenBucket(rate=1e9, capacity=1e9))
+
+    watcher = _LockWatcher()
+    logging.getLogger().addHandler(watcher)
+    barrier = threading.Barrier(threads)
+    mismatches, errors = [], []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(quotes_per_thread):
+            args = rng.choice(workload)
+            try:
+                res = eng.calculate_cost(*args, deadline=30)
+            except Exception as exc:
+                errors.append(f"{args[0]}: {type(exc).__name__}: {exc}")
+                continue
+            # O audit tem que ser desta cotação (e não de uma sessão vizinha)
+            fx_entries = [e for e in res["audit"] if e["stage"] == "fx" and "currency" in e]
+            if _fingerprint(res) != reference[args] or len(fx_entries) != 1 or fx_entries[0]["currency"] != args[4]:
+                mismatches.append(args)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    logging.getLogger().removeHandler(watcher)
+
+    total = threads * quotes_per_thread
+    print(f"Estresse: {threads} threads x {quotes_per_thread} cotações = {total} em {elapsed:.2f} s "
+          f"({total / elapsed:.0f} cotações/s)")
+    print(f"  divergências: {len(mismatches)}  exceções: {len(errors)}  'database is locked': {len(watcher.hits)}")
+    for line in (errors + watcher.hits)[:5]:
+        print(f"  {line}")
+    ok = not (mismatches or errors or watcher.hits)
+    print("✅ Resultados idênticos à execução sequencial" if ok else "❌ Engine não é reentrante")
+    return 0 if ok else 1
+
+
+def compare(results, baseline, margin):
+    """Lista de regressões: p50 acima da linha de base + margem."""
+    failures = []
+    for name, res in results.items():
+        ref = baseline.get(name)
+        if not ref:
+            continue
+        limit = ref["p50_us"] * (1 + margin)
+        if res["p50_us"] > limit:
+            failures.append((name, res["p50_us"], ref["p50_us"]))
+    return failures
+
+
+# Destinos que quebram em 1 a 6 linhas (width=14): os longos empurram o quadro do total sobre o rodapé
+TICKET_CASES = [
+    ("Paris", 9876.54, 705.47, 7, "cultura", "EUR"),
+    ("Fernando de Noronha", 12345.67, 456.78, 7, "gastro", "BRL"),
+    ("Chapada dos Veadeiros e Pirenópolis", 8000.0, 400.0, 10, "natureza", "BRL"),
+    ("Lençóis Maranhenses, Jericoacoara e Barra Grande", 15000.0, 500.0, 15, "natureza", "BRL"),
+    ("Volta ao mundo: Tóquio, Kyoto, Bangkok, Bali, Sydney e Auckland", 99999.99, 1234.56, 30, "festa", "USD"),
+]
+
+
+def reference_ticket(gen, destination, total, daily, days, vibe, currency):
+    """Desenho original do ticket, tudo numa passada e o rodapé por último (referência do --check-tickets)."""
+    from PIL import Image, ImageDraw
+    import share
+    W, H, margin, top, footer_h = share.W, share.H, share.MARGIN, share.CARD_TOP, share.FOOTER_H
+    img = Image.new('RGB', (W, H), color='#1E88E5')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([(margin, top), (W-margin, H - 120)], fill='#FFFFFF', outline=None)
+    draw.text((W/2, 60), "Takeitiz 🧳", font=gen.font_logo, fill='#FFFFFF', anchor="mm")
+    cursor = top + 80
+    for line in share.textwrap.wrap(destination.upper(), width=14):
+        draw.text((W/2, cursor), line, font=gen.font_dest, fill='#333333', anchor="mm")
+        cursor += 50
+    cursor += 40
+    draw.line([(150, cursor), (450, cursor)], fill='#EEEEEE', width=3)
+    cursor += 60
+    draw.text((W/2, cursor), "POR PESSOA / DIA", font=gen.font_label, fill='#888888', anchor="mm")
+    cursor += 50
+    draw.text((W/2, cursor), gen.format_money(daily, currency), font=gen.font_hero, fill='#1E88E5', anchor="mm")
+    cursor += 120
+    draw.rectangle([(margin+20, cursor), (W-margin-20, cursor+140)], fill='#F5F9FF')
+    txt_y = cursor + 35
+    draw.text((W/2, txt_y), f"TOTAL ({days} DIAS)", font=gen.font_label, fill='#555555', anchor="mm")
+    draw.text((W/2, txt_y+40), gen.format_money(total, currency), font=gen.font_url, fill='#333333', anchor="mm")
+    draw.text((W/2, txt_y+80), f"Vibe: {vibe.title()}", font=gen.font_label, fill='#1E88E5', anchor="mm")
+    draw.rectangle([(0, H - footer_h), (W, H)], fill='#212121')
+    draw.text((W/2, H - (footer_h/2)), "Baixe agora: takeitiz.com.br", font=gen.font_url, fill='#FFFFFF', anchor="mm")
+    return img
+
+
+def check_tickets():
+    import io
+    from PIL import Image, ImageChops
+    import share
+    gen = share.TicketGenerator()
+    failures = 0
+    for case in TICKET_CASES:
+        expected = reference_ticket(gen, *case)
+        got = Image.open(io.BytesIO(gen.create_ticket(*case).getvalue())).convert('RGB')
+        diff = ImageChops.difference(expected, got).getbbox()
+        lines = len(share.textwrap.wrap(case[0].upper(), width=14))
+        print(f"{'OK ' if diff is None else 'DIF'} {lines} linha(s)  {case[0]!r}" + (f"  pixels diferentes em {diff}" if diff else ""))
+        failures += diff is not None
+    if failures:
+        print(f"\n❌ {failures} ticket(s) diferentes do desenho original")
+        return 1
+    print(f"\n✅ {len(TICKET_CASES)} tickets idênticos ao desenho original, pixel a pixel")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline do Takeitiz")
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", default="", help="roda só cenários que contêm este texto")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--margin", type=float, default=0.25, help="regressão tolerada no p50 (0.25 = 25%%)")
+    parser.add_argument("--json", dest="json_out", help="grava os resultados completos neste arquivo")
+    parser.add_argument("--stress", type=int, metavar="THREADS", help="roda o teste de estresse concorrente")
+    parser.add_argument("--stress-quotes", type=int, default=200, help="cotações por thread no estresse")
+    parser.add_argument("--check-tickets", action="store_true", help="compara os tickets com o desenho original")
+    args = parser.parse_args(argv)
+
+    if args.check_tickets:
+        return check_tickets()
+    engine = install_stubs()
+    if args.stress:
+        return stress(engine, args.stress, args.stress_quotes)
+    scenarios = build_scenarios(engine)
+
+    results = {}
+    print(f"{'cenário':<48}{'p50 µs':>10}{'p95 µs':>10}{'p99 µs':>10}{'max µs':>11}{'bytes/call':>12}")
+    for name, fn in scenarios.items():
+        if args.only and args.only not in name:
+            continue
+        res = results[name] = measure(fn, args.iterations, args.warmup)
+        print(f"{name:<48}{res['p50_us']:>10.1f}{res['p95_us']:>10.1f}{res['p99_us']:>10.1f}"
+              f"{res['max_us']:>11.1f}{res['retained_bytes_per_call']:>12.0f}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f"\nLinha de base gravada em {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nSem linha de base ({args.baseline}); use --save-baseline para criar.")
+        return 0
+
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    failures = compare(results, baseline, args.margin)
+    if failures:
+        print(f"\n❌ {len(failures)} regressão(ões) acima de {args.margin:.0%}:")
+        for name, now, ref in failures:
+            print(f"  {name}: p50 {now:.1f} µs (base {ref:.1f} µs, +{now / ref - 1:.0%})")
+        return 1
+    print(f"\n✅ Nenhuma regressão acima de {args.margin:.0%} em relação a {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
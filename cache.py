@@ -0,0 +1,232 @@
+# cache.py
+# Caches compartilhados pelo processo: LRU em memória (L1) e camadas persistentes (L2).
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+import telemetry
+
+
+class LRUCache:
+    """
+    Cache LRU limitado com TTL opcional, seguro para várias threads.
+    Conta acertos, faltas e despejos para acompanhar a eficiência.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+# --- CACHE EM CAMADAS (L1 memória -> L2 persistente) ---
+# O L2 é plugável: SQLite (WAL) local ou Redis compartilhado entre réplicas.
+# Cada provedor (namespace) tem sua política de TTL em config.CACHE_POLICIES.
+
+_MISS = object()
+
+
+class SQLiteBackend:
+    """L2 em arquivo SQLite (WAL): leitores não bloqueiam escritores, vários processos no mesmo host."""
+
+    def __init__(self, path=None):
+        self.path = path or config.CACHE_SQLITE_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at)")
+            self._conn.commit()
+
+    def get(self, namespace, key):
+        """(valor, expira_em) ou None. Expira_em em epoch (time.time)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, namespace, key, value, ttl):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), time.time() + ttl),
+            )
+            self._conn.commit()
+
+    def delete_expired(self):
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM kv WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+        return cur.rowcount
+
+
+class RedisBackend:
+    """L2 compartilhado entre réplicas (qualquer servidor compatível com Redis). Expiração nativa."""
+
+    PREFIX = "takeitiz"
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            import redis  # dependência opcional: só quem usa CACHE_BACKEND="redis" precisa instalar
+            client = redis.Redis.from_url(url or config.CACHE_REDIS_URL, socket_timeout=0.5)
+        self.client = client
+
+    def _key(self, namespace, key):
+        return f"{self.PREFIX}:{namespace}:{key}"
+
+    def get(self, namespace, key):
+        k = self._key(namespace, key)
+        pipe = self.client.pipeline()
+        pipe.get(k)
+        pipe.pttl(k)
+        raw, pttl = pipe.execute()
+        if raw is None:
+            return None
+        expires_at = time.time() + (pttl / 1000.0 if pttl and pttl > 0 else 0)
+        return json.loads(raw), expires_at
+
+    def set(self, namespace, key, value, ttl):
+        self.client.set(self._key(namespace, key), json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def delete_expired(self):
+        return 0
+
+
+class TieredCache:
+    """
+    get(key) -> (True, valor) ou (False, None). Valor None é um acerto negativo válido.
+    Política (config.CACHE_POLICIES[namespace]): ttl, negative_ttl, error_ttl, l1_size (0 = sem L1, só o L2).
+    Falhas do L2 nunca derrubam a cotação: viram miss e são contadas na telemetria.
+    """
+
+    def __init__(self, namespace, backend=None, policy=None):
+        self.namespace = namespace
+        self.policy = dict(config.CACHE_POLICIES.get(namespace, {}), **(policy or {}))
+        self.backend = backend if backend is not None else shared_backend()
+        l1_size = self.policy.get('l1_size', 1024)
+        self.l1 = LRUCache(maxsize=l1_size) if l1_size > 0 else None
+
+    def get(self, key):
+        value = self.l1.get(key, _MISS) if self.l1 is not None else _MISS
+        if value is not _MISS:
+            telemetry.count('takeitiz_cache_total', namespace=self.namespace, tier='l1', result='hit')
+            return True, value
+        try:
+            row = self.backend.get(self.namespace, key)
+        except Exception as exc:
+            telemetry.suppressed(f'cache.{self.namespace}', exc)
+            row = None
+        if row is None:
+            telemetry.count('takeitiz_cache_total', namespace=self.namespace, tier='l2', result='miss')
+            return False, None
+        value, expires_at = row
+        # Promove para o L1 só pelo tempo que ainda resta no L2
+        if self.l1 is not None:
+            self.l1.set(key, value, ttl=max(0.0, expires_at - time.time()))
+        telemetry.count('takeitiz_cache_total', namespace=self.namespace, tier='l2', result='hit')
+        return True, value
+
+    def set(self, key, value, ttl=None, kind='ttl'):
+        """kind: 'ttl' (positivo), 'negative_ttl' (não existe) ou 'error_ttl' (falha temporária)."""
+        if ttl is None:
+            ttl = self.policy.get(kind, self.policy.get('ttl', 3600))
+        if ttl <= 0:
+            return
+        if self.l1 is not None:
+            self.l1.set(key, value, ttl=ttl)
+        try:
+            self.backend.set(self.namespace, key, value, ttl)
+        except Exception as exc:
+            telemetry.suppressed(f'cache.{self.namespace}', exc)
+
+
+# --- BACKEND COMPARTILHADO + LIMPEZA EM BACKGROUND ---
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def _janitor(backend, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            removed = backend.delete_expired()
+            if removed:
+                logging.info("Cache: %s linhas expiradas removidas", removed)
+        except Exception as exc:
+            telemetry.suppressed('cache.janitor', exc)
+
+
+def make_backend(kind=None):
+    kind = kind or config.CACHE_BACKEND
+    if kind == "redis":
+        return RedisBackend()
+    return SQLiteBackend()
+
+
+def shared_backend():
+    """L2 único por processo, escolhido por config.CACHE_BACKEND."""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            _BACKEND = make_backend()
+            threading.Thread(target=_janitor, args=(_BACKEND, config.CACHE_CLEANUP_SECONDS),
+                             daemon=True, name="takeitiz-cache-janitor").start()
+        return _BACKEND
@@ -2,12 +2,114 @@
 # PAINEL DE CONTROLE DO TAKEITIZ
 # Atualize este arquivo sempre que precisar mudar Cotações ou IDs de Parceiros.
 
+import os
+
 # --- 1. CÂMBIO MANUAL (FALLBACK) ---
 # Usado quando as APIs automáticas falham. 
 # Atualize toda sexta-feira se desejar precisão máxima.
 EXCHANGE_RATE_BRL_FALLBACK = 6.00  # Teto seguro para o Dólar
 EXCHANGE_RATE_EUR_FALLBACK = 0.95  # Paridade Euro/Dólar (1 EUR = ~1.05 USD, invertido 0.95)
 
+# Fallback de todas as moedas da cesta (unidades por 1 USD, já com margem de segurança)
+FX_FALLBACK_RATES = {
+    "BRL": EXCHANGE_RATE_BRL_FALLBACK,
+    "EUR": EXCHANGE_RATE_EUR_FALLBACK,
+    "GBP": 0.82,
+    "ARS": 1500.0,
+    "CLP": 1000.0,
+    "MXN": 20.0,
+}
+
+# --- 1.1 CÂMBIO AUTOMÁTICO (CACHE DO PROCESSO) ---
+# A cotação fica em memória e é servida na hora; depois do TTL é atualizada em background.
+FX_TTL_SECONDS = 900         # Validade da cotação (15 min)
+FX_COLD_WAIT_SECONDS = 2.0   # Espera máxima pela 1ª cotação após o deploy (depois usa o fallback)
+FX_RETRY_SECONDS = 60        # Intervalo mínimo entre tentativas quando as APIs estão fora
+
+# Cesta de moedas: uma única coleta (yfinance, depois awesomeapi) traz todas contra o USD.
+# Nova moeda = entrar aqui + fallback acima; nenhuma chamada de rede a mais.
+FX_CURRENCIES = ("BRL", "EUR", "GBP", "ARS", "CLP", "MXN")
+
+# Spread do turista (cartão/casa de câmbio) por moeda, sobre a cotação média. Ausente = 1.0
+FX_TOURIST_SPREADS = {
+    "BRL": 1.045,
+}
+
+# --- 1.2 ORÇAMENTO DE LATÊNCIA DA COTAÇÃO ---
+# Câmbio e geolocalização rodam em paralelo; quem passar do prazo usa o valor padrão.
+QUOTE_DEADLINE_SECONDS = 2.5
+PROVIDER_POOL_SIZE = 8
+QUOTE_CACHE_SIZE = 4096          # Orçamentos (núcleo em USD) memorizados por processo
+QUOTE_CACHE_TTL_SECONDS = 3600
+PRICE_GRID_CHECK_SECONDS = 10   # Intervalo para conferir se a base/modelo mudou (refaz a tabela de preços)
+
+# --- 1.2.1 BASE DE DESTINOS (destinations.csv -> .npy em mmap, recarregada a quente) ---
+# Edite o CSV e a nova versão entra no ar sozinha; CSV inválido é rejeitado e a versão atual continua.
+DESTINATIONS_CHECK_SECONDS = 5   # Intervalo para conferir se o CSV mudou
+DESTINATIONS_DIR = os.environ.get("TAKEITIZ_DESTINATIONS_DIR", "")  # Onde ficam os .npy ("" = ao lado do CSV)
+DESTINATIONS_MAX_SHRINK = 0.2    # Fração das cidades que pode sumir numa recarga; acima disso = CSV truncado, rejeita
+                                 # (para um corte grande de propósito, suba este valor no deploy)
+
+# --- 1.2.2 AUTOCOMPLETAR (ÍNDICE DE TRIGRAMAS EM MEMÓRIA) ---
+AUTOCOMPLETE_LIMIT = 5          # Sugestões por consulta
+AUTOCOMPLETE_BUDGET_MS = 5.0    # Orçamento por tecla; ao estourar, devolve o que já ranqueou
+
+# --- 1.3 GEOLOCALIZAÇÃO (NOMINATIM) ---
+# Destinos fora da base são geocodificados uma vez e guardados no cache (L2).
+GEOCODE_TTL_SECONDS = 90 * 24 * 3600         # Lugares não mudam de país: 90 dias
+GEOCODE_NEGATIVE_TTL_SECONDS = 7 * 24 * 3600 # "Não encontrado" vale 7 dias
+GEOCODE_ERROR_TTL_SECONDS = 300              # Timeout/erro de rede: tenta de novo em 5 min
+GEOCODE_RATE_PER_SECOND = 1.0                # Política de uso do Nominatim
+GEOCODE_LIMITER_WAIT_SECONDS = 2.0           # Espera máxima na fila do limitador
+
+# --- 1.3.1 CACHE EM CAMADAS (L1 memória -> L2 persistente) ---
+# L2 "sqlite": arquivo local em WAL (um por host).
+# L2 "redis": compartilhado entre réplicas (pip install redis). Ex: TAKEITIZ_CACHE_BACKEND=redis
+CACHE_BACKEND = os.environ.get("TAKEITIZ_CACHE_BACKEND", "sqlite")
+CACHE_SQLITE_PATH = os.environ.get("TAKEITIZ_CACHE_PATH", "takeitiz_l2.sqlite")
+CACHE_REDIS_URL = os.environ.get("TAKEITIZ_REDIS_URL", "redis://localhost:6379/0")
+CACHE_CLEANUP_SECONDS = 600  # Limpeza das linhas expiradas em background
+
+# TTL por provedor. 'negative_ttl' = "não existe"; 'error_ttl' = falha temporária.
+CACHE_POLICIES = {
+    # A última cotação boa fica 1 dia no L2 (frescor é controlado por FX_TTL_SECONDS).
+    # Sem L1: o FXRateStore já é a camada em memória e precisa enxergar o L2 de outras réplicas.
+    'fx': {'ttl': 24 * 3600, 'negative_ttl': 0, 'error_ttl': 0, 'l1_size': 0},
+    'geocode': {
+        'ttl': GEOCODE_TTL_SECONDS,
+        'negative_ttl': GEOCODE_NEGATIVE_TTL_SECONDS,
+        'error_ttl': GEOCODE_ERROR_TTL_SECONDS,
+        'l1_size': 4096,
+    },
+}
+
+# --- 1.3.2 RESILIÊNCIA (CIRCUIT BREAKERS + HEDGE) ---
+# Upstream com falhas seguidas é pulado na hora (sem esperar timeout) e testado de tempos em tempos.
+BREAKER_FAILURE_THRESHOLD = 3   # Falhas seguidas para abrir o circuito
+BREAKER_RESET_SECONDS = 30      # Tempo aberto antes da chamada de teste (meio-aberto)
+BREAKER_POLICIES = {            # Por upstream (yfinance, awesomeapi, nominatim); sobrescreve os padrões
+    'nominatim': {'failure_threshold': 5, 'reset_seconds': 60},
+}
+# Hedge do câmbio: se o yfinance não responder em X s, o awesomeapi é disparado em paralelo (0 = desligado)
+FX_HEDGE_SECONDS = 1.0
+
+# --- 1.4 TELEMETRIA (PROMETHEUS) ---
+# Contadores e latências por etapa no formato texto do Prometheus.
+TELEMETRY_PORT = 0            # Ex: 9464 -> http://127.0.0.1:9464/metrics (0 = desligado)
+TELEMETRY_FILE = ""           # Ex: "/var/lib/node_exporter/takeitiz.prom" ("" = desligado)
+TELEMETRY_FLUSH_SECONDS = 15  # Intervalo de gravação do arquivo
+
+# --- 1.4.1 PERFIL POR AMOSTRAGEM (OPT-IN) ---
+# Cotação/ticket acima do limite grava as pilhas amostradas (formato collapsed, p/ flame graph) em PROFILE_DIR.
+# Liga no processo com TAKEITIZ_PROFILE=1 ou numa sessão com ?profile=<TAKEITIZ_PROFILE_TOKEN>.
+PROFILE_ENABLED = os.environ.get("TAKEITIZ_PROFILE", "") not in ("", "0")
+PROFILE_ADMIN_TOKEN = os.environ.get("TAKEITIZ_PROFILE_TOKEN", "")  # "" = parâmetro de admin desligado
+PROFILE_DIR = os.environ.get("TAKEITIZ_PROFILE_DIR", "profiles")
+PROFILE_THRESHOLD_MS = 1000          # Só grava requisições mais lentas que isso
+PROFILE_INTERVAL_MS = 5              # Intervalo entre amostras
+PROFILE_MAX_FILES = 200              # Rotação: perfis guardados no máximo...
+PROFILE_MAX_BYTES = 50 * 1024 * 1024 # ...e espaço total em disco
+
 # --- 2. MONETIZAÇÃO (IDs de Afiliado) ---
 # Deixe em branco ("") se não tiver o ID ainda. O sistema usará links padrão/Google.
 
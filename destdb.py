@@ -0,0 +1,349 @@
+# destdb.py
+# Base de destinos colunar, validada e recarregável a quente.
+# - Fonte versionada: destinations.csv (uma linha por cidade; nome de exibição em 'name',
+#   apelidos em 'aliases', separados por |).
+# - Compilada para destinations-v<schema>-<sha>.npy (array estruturado NumPy) e aberta com mmap:
+#   processo novo carrega sem reinterpretar o CSV. O dict `cities` (formato histórico, lido por
+#   matcher, autocompletar e grade de preços) é montado em cada processo; só o arquivo é compartilhado.
+# - Quando o CSV muda, uma thread de fundo valida, compila e publica a nova versão numa troca atômica
+#   de referência; enquanto isso (e depois, para quem já pegou um snapshot) vale a versão anterior.
+#   CSV inválido, ou que perdeu cidades demais de uma vez (CSV truncado no meio da escrita), nunca
+#   derruba a versão no ar.
+#
+# Uso:
+#   python destdb.py compile     # valida e compila (Dockerfile)
+#   python destdb.py validate    # só valida (CI / antes de publicar uma calibração)
+
+import csv
+import glob
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+from collections.abc import Mapping
+
+import numpy as np
+
+import config
+import telemetry
+from matcher import normalize
+
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "destinations.csv")
+
+SCHEMA_VERSION = 2
+PROFILES = ('norte_temperado', 'sul_tropical', 'inverno_fugitivo', 'sul_frio', 'padrao')
+MODIFIERS = ('lodging', 'food', 'transport', 'activities', 'nightlife', 'misc')
+IDX_RANGE = (20, 1000)
+MODIFIER_RANGE = (0.1, 10.0)
+KEY_LEN = 48
+NAME_LEN = 64
+
+# Modifier ausente = NaN (o dict de compatibilidade só traz os que foram calibrados)
+DTYPE = np.dtype(
+    [('key', f'U{KEY_LEN}'), ('alias_of', f'U{KEY_LEN}'), ('name', f'U{NAME_LEN}'), ('idx', '<i4'), ('profile', 'U24')]
+    + [(m, '<f8') for m in MODIFIERS]
+)
+
+
+class DestinationDataError(ValueError):
+    """CSV ou arquivo compilado fora do esquema; a mensagem lista as linhas com problema."""
+
+
+# --- 1. VALIDAÇÃO + COMPILAÇÃO ---
+def parse(path=SOURCE_PATH):
+    """Lê e valida o CSV. Devolve a lista de registros (tuplas no formato de DTYPE)."""
+    records, errors, seen = [], [], {}
+
+    def check_key(key, line):
+        if not key or len(key) > KEY_LEN or key != normalize(key):
+            errors.append(f"linha {line}: chave {key!r} deve ser minúscula, sem acento e até {KEY_LEN} caracteres")
+        elif key in seen:
+            errors.append(f"linha {line}: {key!r} repetida (já definida na linha {seen[key]})")
+        else:
+            seen[key] = line
+
+    with open(path, encoding="utf-8", newline="") as fh:
+        for line, row in enumerate(csv.DictReader(fh), start=2):
+            key = (row.get('key') or '').strip()
+            check_key(key, line)
+            name = (row.get('name') or '').strip() or key
+            if len(name) > NAME_LEN or normalize(name) == '':
+                errors.append(f"linha {line}: nome {name!r} inválido")
+            try:
+                idx = int(row.get('idx'))
+                if not IDX_RANGE[0] <= idx <= IDX_RANGE[1]:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errors.append(f"linha {line}: idx {row.get('idx')!r} fora de {IDX_RANGE}")
+                idx = 0
+            profile = (row.get('profile') or '').strip()
+            if profile not in PROFILES:
+                errors.append(f"linha {line}: perfil {profile!r} desconhecido")
+            mods = []
+            for mod in MODIFIERS:
+                raw = (row.get(mod) or '').strip()
+                if not raw:
+                    mods.append(np.nan)
+                    continue
+                try:
+                    value = float(raw)
+                    if not MODIFIER_RANGE[0] <= value <= MODIFIER_RANGE[1]:
+                        raise ValueError
+                except ValueError:
+                    errors.append(f"linha {line}: {mod} {raw!r} fora de {MODIFIER_RANGE}")
+                    value = np.nan
+                mods.append(value)
+
+            records.append((key, '', name, idx, profile, *mods))
+            # Apelido = mesma linha com outra chave, logo depois da principal (ordem importa no matcher)
+            for alias in filter(None, (a.strip() for a in (row.get('aliases') or '').split('|'))):
+                check_key(alias, line)
+                records.append((alias, key, name, idx, profile, *mods))
+
+    if not records:
+        errors.append("nenhum destino")
+    if errors:
+        raise DestinationDataError(f"{path}: " + "; ".join(errors[:20]))
+    return records
+
+
+def source_version(path=SOURCE_PATH):
+    with open(path, "rb") as fh:
+        return hashlib.sha1(fh.read()).hexdigest()[:12]
+
+
+def compiled_path(version, out_dir=None, source=SOURCE_PATH):
+    out_dir = out_dir or config.DESTINATIONS_DIR or os.path.dirname(os.path.abspath(source))
+    return os.path.join(out_dir, f"destinations-v{SCHEMA_VERSION}-{version}.npy")
+
+
+def compile_source(path=SOURCE_PATH, out_dir=None):
+    """Valida e compila o CSV. Idempotente: a mesma versão do CSV reaproveita o arquivo já compilado."""
+    version = source_version(path)
+    out = compiled_path(version, out_dir, path)
+    if os.path.exists(out):
+        return out, version
+    table = np.array(parse(path), dtype=DTYPE)
+    # Escrita atômica: nenhum processo abre um .npy pela metade
+    tmp = f"{out}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        np.save(fh, table)
+    os.replace(tmp, out)
+    return out, version
+
+
+def load(path):
+    table = np.load(path, mmap_mode='r')
+    if table.dtype != DTYPE:
+        raise DestinationDataError(f"{path}: esquema {table.dtype} diferente de v{SCHEMA_VERSION}")
+    return table
+
+
+def check_shrink(table, baseline, path, max_shrink=None):
+    """Rejeita a versão que perdeu mais de max_shrink das cidades principais (ex: CSV lido pela metade)."""
+    max_shrink = config.DESTINATIONS_MAX_SHRINK if max_shrink is None else max_shrink
+    before = int((baseline['alias_of'] == '').sum())
+    after = int((table['alias_of'] == '').sum())
+    if after < before * (1 - max_shrink):
+        raise DestinationDataError(f"{path}: {after} cidades contra {before} da versão atual "
+                                   f"(mais de {max_shrink:.0%} sumiram; CSV truncado?)")
+
+
+# --- 2. SNAPSHOT IMUTÁVEL ---
+class CityTable(dict):
+    """dict no formato histórico de database.CITIES, marcado com a versão da base."""
+    version = None
+
+
+class Snapshot:
+    def __init__(self, table, version, path):
+        self.table = table  # colunas (mmap, somente leitura); `cities` é uma cópia por processo
+        self.version = version
+        self.path = path
+        cities = CityTable()
+        cities.version = version
+        mods = {m: table[m].tolist() for m in MODIFIERS}
+        for i, (key, alias_of, name, idx, profile) in enumerate(zip(
+                table['key'].tolist(), table['alias_of'].tolist(), table['name'].tolist(),
+                table['idx'].tolist(), table['profile'].tolist())):
+            entry = {'idx': idx, 'profile': profile, 'name': name}
+            present = {m: mods[m][i] for m in MODIFIERS if mods[m][i] == mods[m][i]}  # NaN != NaN
+            if present:
+                entry['modifiers'] = present
+            if alias_of:
+                entry['alias_of'] = alias_of
+            cities[key] = entry
+        self.cities = cities
+
+
+# --- 3. TROCA A QUENTE ---
+class DestinationStore:
+    """
+    current() devolve o snapshot publicado; a cada config.DESTINATIONS_CHECK_SECONDS dispara uma
+    thread de fundo que confere (por stat) se o CSV mudou e recarrega. Só uma recarga por vez;
+    a requisição nunca espera a compilação.
+    """
+
+    def __init__(self, source=SOURCE_PATH, out_dir=None, check_seconds=None):
+        self.source = source
+        self.out_dir = out_dir
+        self.check_seconds = config.DESTINATIONS_CHECK_SECONDS if check_seconds is None else check_seconds
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stat = None
+        self._checked_at = time.monotonic()
+        self.reload(force=True)
+
+    def _stat_source(self):
+        st = os.stat(self.source)
+        return st.st_mtime_ns, st.st_size
+
+    def _latest_compiled(self, exclude=None):
+        pattern = compiled_path("*", self.out_dir, self.source)
+        files = sorted((f for f in glob.glob(pattern) if f != exclude), key=os.path.getmtime)
+        return files[-1] if files else None
+
+    def reload(self, force=False):
+        """Recompila e publica se o CSV mudou. Devolve True se trocou o snapshot."""
+        if not self._lock.acquire(blocking=force):
+            return False  # outra thread já está recarregando
+        try:
+            self._checked_at = time.monotonic()
+            stat = self._stat
+            try:
+                stat = self._stat_source()
+                if not force and stat == self._stat:
+                    return False
+                path, version = compile_source(self.source, self.out_dir)
+                if self._snapshot is not None and version == self._snapshot.version:
+                    self._stat = stat
+                    return False
+                table = load(path)
+                self._check_shrink(table, path)
+                snapshot = Snapshot(table, version, path)
+            except (OSError, DestinationDataError) as exc:
+                telemetry.count('takeitiz_destinations_reloads_total', result='invalid')
+                logging.error("Base de destinos: versão rejeitada, mantendo a atual (%s)", exc)
+                if self._snapshot is not None:
+                    self._stat = stat  # só tenta de novo quando o CSV mudar outra vez
+                    return False
+                # Primeira carga: último arquivo compilado bom, senão não há como cotar
+                fallback = self._latest_compiled()
+                if fallback is None:
+                    raise
+                snapshot = Snapshot(load(fallback), os.path.basename(fallback)[:-4].rsplit('-', 1)[-1], fallback)
+
+            previous = self._snapshot
+            self._stat = stat
+            self._snapshot = snapshot  # troca atômica: leitores veem a versão antiga ou a nova, inteira
+            telemetry.count('takeitiz_destinations_reloads_total', result='ok')
+            logging.info("Base de destinos: versão %s (%d chaves, %.1f KiB em mmap)",
+                         snapshot.version, len(snapshot.cities), snapshot.table.nbytes / 1024)
+            if previous is not None and previous.path != snapshot.path:
+                self._prune(keep=snapshot.path)
+            return True
+        finally:
+            self._lock.release()
+
+    def _check_shrink(self, table, path):
+        # Referência: a versão no ar; na primeira carga, o último arquivo compilado (outra versão)
+        if self._snapshot is not None:
+            baseline = self._snapshot.table
+        else:
+            latest = self._latest_compiled(exclude=path)
+            if latest is None:
+                return
+            baseline = load(latest)
+        try:
+            check_shrink(table, baseline, path)
+        except DestinationDataError:
+            # Não deixa o .npy rejeitado virar o "último compilado bom" de um restart
+            os.remove(path)
+            raise
+
+    def _prune(self, keep):
+        # Snapshots antigos ainda em uso seguram o mmap aberto; apagar o arquivo não os afeta (POSIX)
+        for path in glob.glob(compiled_path("*", self.out_dir, self.source)):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def current(self):
+        if time.monotonic() - self._checked_at >= self.check_seconds:
+            self._checked_at = time.monotonic()  # uma thread por intervalo, não uma por requisição
+            threading.Thread(target=self._background_reload, daemon=True, name="destdb-reload").start()
+        return self._snapshot
+
+    def _background_reload(self):
+        try:
+            self.reload()
+        except Exception as exc:
+            telemetry.suppressed('destdb.reload', exc)
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def store():
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = DestinationStore()
+        return _STORE
+
+
+def current():
+    """Snapshot corrente. Guarde a referência durante a cotação para não misturar versões."""
+    return store().current()
+
+
+class CitiesView(Mapping):
+    """database.CITIES compatível (somente leitura): sempre a versão publicada."""
+
+    @property
+    def version(self):
+        return current().version
+
+    def __getitem__(self, key):
+        return current().cities[key]
+
+    def __iter__(self):
+        return iter(current().cities)
+
+    def __len__(self):
+        return len(current().cities)
+
+    # items()/keys()/values() de um único snapshot, mesmo se houver troca no meio da iteração
+    def items(self):
+        return current().cities.items()
+
+    def keys(self):
+        return current().cities.keys()
+
+    def values(self):
+        return current().cities.values()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "compile"
+    try:
+        if command == "validate":
+            records = parse()
+            print(f"✅ {SOURCE_PATH}: {len(records)} chaves válidas (versão {source_version()})")
+        else:
+            path, version = compile_source()
+            print(f"✅ {path} ({len(load(path))} chaves, versão {version})")
+    except DestinationDataError as exc:
+        print(f"❌ {exc}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,30 @@
 import time
 import logging
 import math
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 import numpy as np
-import requests
-import requests_cache
-import unicodedata
 from datetime import datetime
-from geopy.geocoders import Nominatim
-import database
+import destdb
+import matcher
+import geocache
+import gazetteer
+import autocomplete
+import pricegrid
+import resilience
+import telemetry
+from cache import LRUCache, TieredCache
 import config  # <--- IMPORTANDO O PAINEL DE CONTROLE
 
 # --- CONFIGURAÇÃO ---
-requests_cache.install_cache('takeitiz_cache', expire_after=3600)
 logging.basicConfig(level=logging.INFO)
 
+# Dependências de rede (requests, geopy, yfinance) são importadas sob demanda:
+# o import do engine fica leve e o warmup.py as carrega antes do container ficar pronto.
+# Cache de respostas fica a cargo de cache.TieredCache (por provedor), não de um patch global.
+
 # --- 1. A ÂNCORA (GLOBAL BASELINE - MADRID) ---
 BASE_SPEND_USD_ANCHOR = {
     'food': 45.0, 
@@ -45,62 +56,298 @@ class StyleConfig:
     }
 
 # --- 3. PROVEDOR DE CÂMBIO ---
+FXQuote = namedtuple('FXQuote', ['rate', 'source', 'fetched_at'])
+
+class FXBasket:
+    """
+    Cesta de câmbio: vetor de cotações médias (unidades da moeda por 1 USD), uma por moeda
+    de config.FX_CURRENCIES, com fonte e momento da coleta de cada uma.
+    Qualquer par sai por triangulação via USD (FXProvider.get_cross_rate).
+    """
+    def __init__(self, currencies, rates, sources, fetched_at):
+        self.currencies = tuple(currencies)
+        self.index = {c: i for i, c in enumerate(self.currencies)}
+        self.rates = np.asarray(rates, dtype=float)
+        self.sources = list(sources)
+        self.fetched_at = np.asarray(fetched_at, dtype=float)
+
+    def quote(self, currency):
+        i = self.index.get(currency)
+        if i is None:
+            return None
+        return FXQuote(float(self.rates[i]), self.sources[i], float(self.fetched_at[i]))
+
+    def merged(self, newer):
+        """Moeda a moeda, fica a cotação mais recente; o fallback do config.py nunca sobrescreve uma real."""
+        rates, sources, fetched = self.rates.copy(), list(self.sources), self.fetched_at.copy()
+        for c, j in newer.index.items():
+            i = self.index.get(c)
+            if i is None:
+                continue
+            if newer.sources[j] == 'config':
+                take = sources[i] == 'config'
+            else:
+                take = sources[i] == 'config' or newer.fetched_at[j] > fetched[i]
+            if take:
+                rates[i], sources[i], fetched[i] = newer.rates[j], newer.sources[j], newer.fetched_at[j]
+        return FXBasket(self.currencies, rates, sources, fetched)
+
+    def stale(self, ttl, now):
+        """Moedas vencidas ou ainda no fallback (a cesta é atualizada inteira, numa coleta só)."""
+        return [c for c, i in self.index.items() if self.sources[i] == 'config' or now - self.fetched_at[i] > ttl]
+
+    def to_json(self):
+        return {'currencies': list(self.currencies), 'rates': self.rates.tolist(),
+                'sources': self.sources, 'fetched_at': self.fetched_at.tolist()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['currencies'], data['rates'], data['sources'], data['fetched_at'])
+
+    @classmethod
+    def fallback(cls, currencies, now):
+        return cls(currencies, [FXProvider.fallback_rate(c) for c in currencies], ['config'] * len(currencies),
+                   [now] * len(currencies))
+
+class FXRateStore:
+    """
+    Cesta de câmbio compartilhada por todo o processo (stale-while-revalidate).
+    Serve sempre a última cotação boa na hora; quando o TTL vence, atualiza a cesta inteira
+    em background, com uma única coleta para todas as moedas.
+    """
+    SHARED_KEY = 'basket'
+
+    def __init__(self, fetcher, currencies=None, ttl=None, cold_wait=None, retry_after=None, shared=None):
+        self.fetcher = fetcher  # [moedas] -> {moeda: (taxa média, fonte)}
+        self.currencies = tuple(config.FX_CURRENCIES if currencies is None else currencies)
+        # L2 compartilhado (SQLite/Redis): réplicas aproveitam a cesta que outra já buscou
+        self.shared = shared
+        self.ttl = config.FX_TTL_SECONDS if ttl is None else ttl
+        self.cold_wait = config.FX_COLD_WAIT_SECONDS if cold_wait is None else cold_wait
+        self.retry_after = config.FX_RETRY_SECONDS if retry_after is None else retry_after
+        self._basket = None
+        self._last_attempt = 0.0
+        self._inflight = None
+        self._lock = threading.Lock()
+
+    def _from_shared(self):
+        if self.shared is None:
+            return None
+        found, value = self.shared.get(self.SHARED_KEY)
+        if not found or not value:
+            return None
+        basket = FXBasket.from_json(value)
+        # Cesta gravada com outra lista de moedas: aproveita só as que coincidem
+        return FXBasket.fallback(self.currencies, 0.0).merged(basket)
+
+    def _adopt(self, basket):
+        with self._lock:
+            self._basket = basket if self._basket is None else self._basket.merged(basket)
+
+    def _refresh(self, done):
+        try:
+            # Outra réplica já atualizou? Usa a dela e poupa a rede
+            shared = self._from_shared()
+            if shared is not None and not shared.stale(self.ttl, time.time()):
+                self._adopt(shared)
+                return
+            with telemetry.stage('fx_refresh'):
+                found = self.fetcher(list(self.currencies))
+            now = time.time()
+            fresh = FXBasket(self.currencies, [found[c][0] for c in self.currencies],
+                             [found[c][1] for c in self.currencies], [now] * len(self.currencies))
+            self._adopt(fresh)
+            if self.shared is not None and any(s != 'config' for s in fresh.sources):
+                self.shared.set(self.SHARED_KEY, self._basket.to_json())
+        except Exception as exc:
+            telemetry.suppressed('fx.refresh', exc)
+        finally:
+            with self._lock:
+                self._inflight = None
+            done.set()
+
+    def _schedule(self):
+        """Dispara (no máximo) uma atualização da cesta. Deve ser chamado com o lock."""
+        if self._inflight is not None:
+            return self._inflight
+        now = time.time()
+        if now - self._last_attempt < self.retry_after and self._basket is not None:
+            return None
+        self._last_attempt = now
+        done = self._inflight = threading.Event()
+        threading.Thread(target=self._refresh, args=(done,), daemon=True, name="fx-refresh").start()
+        return done
+
+    def basket(self):
+        """Cesta atual (ou None antes da 1ª coleta); agenda a atualização se alguma moeda venceu."""
+        if self._basket is None:
+            # Processo novo: a última cesta boa pode estar no L2
+            shared = self._from_shared()
+            if shared is not None:
+                self._adopt(shared)
+        with self._lock:
+            basket = self._basket
+            expired = basket is None or bool(basket.stale(self.ttl, time.time()))
+            done = self._schedule() if expired else None
+        return basket, done
+
+    def get(self, currency):
+        basket, done = self.basket()
+        if basket is not None:
+            quote = basket.quote(currency)
+            return quote or FXQuote(FXProvider.fallback_rate(currency), 'config', time.time())
+
+        # Cold start: espera um pouco pela primeira cesta, depois cai no config.py
+        if done is not None and done.wait(self.cold_wait) and self._basket is not None:
+            quote = self._basket.quote(currency)
+            if quote is not None:
+                return quote
+        return FXQuote(FXProvider.fallback_rate(currency), 'config', time.time())
+
+    def prefetch(self, currency, timeout):
+        """Busca (bloqueando até `timeout`) a cesta. Usado no warm-up, fora do caminho da requisição."""
+        with self._lock:
+            done = self._schedule() if self._basket is None or self._basket.quote(currency) is None else None
+        if done is not None:
+            done.wait(timeout)
+        return self._basket.quote(currency) if self._basket is not None else None
+
+    def age(self, currency):
+        quote = self._basket.quote(currency) if self._basket is not None else None
+        return None if quote is None else time.time() - quote.fetched_at
+
+_FX_STORE = None
+_FX_STORE_LOCK = threading.Lock()
+
 class FXProvider:
-    def __init__(self):
-        self.audit = []
-        
-    def _get_backup_rate(self, target_currency):
-        with requests_cache.disabled():
+    # Sem estado por requisição: o audit de cada cotação vem por parâmetro
+    def __init__(self, store=None):
+        global _FX_STORE
+        if store is None:
+            # Um único store por processo, compartilhado por todas as sessões
+            with _FX_STORE_LOCK:
+                if _FX_STORE is None:
+                    _FX_STORE = FXRateStore(self.fetch_basket, shared=TieredCache('fx'))
+            store = _FX_STORE
+        self.store = store
+
+    @staticmethod
+    def fallback_rate(target_currency):
+        # SPRINT 2: CÂMBIO CENTRALIZADO NO CONFIG.PY (já com margem: não recebe o spread)
+        return config.FX_FALLBACK_RATES.get(target_currency, 1.0)
+
+    @staticmethod
+    def spread(target_currency):
+        return config.FX_TOURIST_SPREADS.get(target_currency, 1.0)
+
+    def _yfinance_basket(self, currencies):
+        """Uma única chamada (yf.download) para a cesta inteira. Símbolos '<MOEDA>=X' = moeda por 1 USD."""
+        import yfinance as yf
+        symbols = [f"{c}=X" for c in currencies]
+        data = yf.download(symbols, period="5d", interval="1d", progress=False, threads=False)
+        last = data['Close'].ffill().iloc[-1]
+        if not hasattr(last, 'get'):  # versões antigas: um só símbolo vira Series
+            last = {symbols[0]: last}
+        found = {}
+        for c, symbol in zip(currencies, symbols):
+            value = last.get(symbol)
+            if value is not None and value == value and value > 0:  # NaN != NaN
+                found[c] = float(value)
+        if not found:
+            # O yfinance costuma "falhar" devolvendo tabela vazia: para o circuit breaker é falha
+            raise ValueError("yfinance sem cotações")
+        return found
+
+    def _get_backup_rates(self, currencies):
+        """awesomeapi com todos os pares numa requisição só (USD-BRL,USD-EUR,...)."""
+        import requests
+        url = "https://economia.awesomeapi.com.br/last/" + ",".join(f"USD-{c}" for c in currencies)
+        response = requests.get(url, timeout=5)
+        response.raise_for_status()
+        data = response.json()
+        found = {}
+        for c in currencies:
+            item = data.get(f"USD{c}")
+            if item:
+                found[c] = float(item['ask'])
+        if not found:
+            raise ValueError("awesomeapi sem cotações")
+        return found
+
+    def _fx_sources(self):
+        return (('yfinance', self._yfinance_basket), ('awesomeapi', self._get_backup_rates))
+
+    def _from_source(self, name, fn, currencies):
+        """Uma fonte sob o seu circuit breaker. Aberto = pulada na hora, sem timeout."""
+        return resilience.breaker(name).call(fn, currencies)
+
+    def fetch_basket(self, currencies):
+        """
+        Cadeia completa para a cesta (yfinance -> awesomeapi -> config.py), no máximo uma chamada
+        por fonte. Com config.FX_HEDGE_SECONDS, o awesomeapi sai em paralelo se o yfinance demorar.
+        Devolve {moeda: (taxa média por USD, fonte)}. Bloqueia na rede: só roda em background.
+        """
+        found = {"USD": (1.0, 'fixed')} if "USD" in currencies else {}
+        sources = self._fx_sources()
+        missing = [c for c in currencies if c not in found]
+        used = set()
+        if missing and config.FX_HEDGE_SECONDS > 0:
+            (primary, primary_fn), (backup, backup_fn) = sources
             try:
-                pair_map = {"BRL": "USD-BRL", "EUR": "EUR-USD"}
-                pair = pair_map.get(target_currency)
-                if not pair: return None
-                
-                url = f"https://economia.awesomeapi.com.br/last/{pair}"
-                response = requests.get(url, timeout=5)
-                response.raise_for_status()
-                data = response.json()
-                key = pair.replace("-", "")
-                
-                if target_currency == "BRL": return float(data[key]['ask'])
-                elif target_currency == "EUR": return 1 / float(data[key]['ask'])
-            except: return None
-
-    def get_rate(self, target_currency):
-        self.audit = [] 
-        if target_currency == "USD": return 1.0
-        TOURIST_SPREAD = 1.045 
-        
-        try:
-            import yfinance as yf
-            if target_currency == "BRL":
-                ticker = yf.Ticker("BRL=X")
-                hist = ticker.history(period="1d")
-                if not hist.empty:
-                    return hist['Close'].iloc[-1] * TOURIST_SPREAD
-            elif target_currency == "EUR":
-                ticker = yf.Ticker("EURUSD=X")
-                hist = ticker.history(period="1d")
-                if not hist.empty:
-                    return 1 / hist['Close'].iloc[-1]
-        except: pass
-
-        backup = self._get_backup_rate(target_currency)
-        if backup:
-            return backup * TOURIST_SPREAD if target_currency == "BRL" else backup
-
-        # SPRINT 2: CÂMBIO CENTRALIZADO NO CONFIG.PY
-        fallback = {
-            "BRL": config.EXCHANGE_RATE_BRL_FALLBACK, 
-            "EUR": config.EXCHANGE_RATE_EUR_FALLBACK
-        } 
-        return fallback.get(target_currency, 1.0)
+                winner, rates = resilience.hedged(partial(self._from_source, primary, primary_fn, missing),
+                                                  partial(self._from_source, backup, backup_fn, missing),
+                                                  config.FX_HEDGE_SECONDS, call='fx')
+                used.update(name for name, _ in sources[:winner + 1])  # backup venceu: primária falhou ou travou
+                found.update((c, (rate, sources[winner][0])) for c, rate in rates.items())
+            except Exception as exc:
+                used.update(name for name, _ in sources)
+                telemetry.suppressed('fx.hedge', exc)
+
+        # Sem hedge (ou moedas que a vencedora não trouxe): fontes em ordem, cada uma sob o seu breaker
+        for name, fn in sources:
+            missing = [c for c in currencies if c not in found]
+            if not missing:
+                break
+            if name in used:
+                continue
+            try:
+                found.update((c, (rate, name)) for c, rate in self._from_source(name, fn, missing).items())
+            except Exception as exc:
+                telemetry.suppressed(f'fx.{name}', exc)
+
+        for c in currencies:
+            found.setdefault(c, (self.fallback_rate(c), 'config'))
+        return found
+
+    def get_quote(self, target_currency):
+        """FXQuote (taxa com o spread da moeda, fonte, momento da coleta) servida do cache do processo."""
+        if target_currency == "USD": return FXQuote(1.0, 'fixed', time.time())
+        quote = self.store.get(target_currency)
+        if quote.source == 'config':
+            return quote
+        return quote._replace(rate=quote.rate * self.spread(target_currency))
+
+    def get_cross_rate(self, base, target):
+        """Quantos `target` por 1 `base`: triangulado via USD na cesta (taxa[alvo] / taxa[base]) + spread do alvo."""
+        if base == target:
+            return 1.0
+        base_rate = 1.0 if base == "USD" else self.store.get(base).rate
+        return self.get_quote(target).rate / base_rate
+
+    def get_rate(self, target_currency, audit=None):
+        with telemetry.stage('fx', audit) as entry:
+            quote = self.get_quote(target_currency)
+            entry.update(currency=target_currency, source=quote.source, age_s=round(time.time() - quote.fetched_at, 1))
+        telemetry.count('takeitiz_fx_source_total', source=quote.source)
+        return quote.rate
 
 # --- 4. GEOLOCALIZAÇÃO ---
 class GeoCostProvider:
+    # Sem estado por requisição: o audit de cada cotação vem por parâmetro
     def __init__(self):
-        self.audit = []
-        self.geolocator = Nominatim(user_agent="takeitiz_app_v11_audit")
+        self._geolocator = None
+        self._geolocator_lock = threading.Lock()
+        self.geocache = geocache.shared_cache()
         
         self.SEASONALITY_MATRIX = {
             'norte_temperado': [0.80, 0.80, 0.90, 0.95, 1.00, 1.10, 1.15, 1.15, 1.00, 0.95, 0.85, 1.00],
@@ -109,104 +356,431 @@ class GeoCostProvider:
             'sul_frio':        [0.80, 0.75, 0.80, 0.90, 0.95, 1.05, 1.15, 1.00, 0.90, 0.85, 1.00, 1.05],
             'padrao':          [1.0, 1.0, 1.0, 1.0, 1.0, 1.05, 1.05, 1.05, 1.0, 1.0, 1.0, 1.05]
         }
+
+        self.set_cities(destdb.current().cities)
+
+    def set_cities(self, cities):
+        """Índices pré-compilados de um snapshot da base: exato + Aho-Corasick e tolerante a erros."""
+        self.matcher = matcher.DestinationMatcher(cities)
+        self.index = autocomplete.DestinationIndex(cities)
         
+    @property
+    def geolocator(self):
+        # geopy só é carregado quando um destino cai na cauda longa
+        if self._geolocator is None:
+            with self._geolocator_lock:
+                if self._geolocator is None:
+                    from geopy.geocoders import Nominatim
+                    self._geolocator = Nominatim(user_agent="takeitiz_app_v11_audit")
+        return self._geolocator
+
+    def season_factors(self, profile, start_date, days, mode="start"):
+        """
+        Vetor (uma posição por diária) com o fator sazonal de cada noite.
+        mode: 'start'   -> mês da data de ida para a viagem inteira (comportamento original)
+              'nightly' -> cada noite pelo próprio mês
+              'smooth'  -> cada noite interpolada linearmente entre os meios de mês vizinhos
+        """
+        if not start_date:
+            return np.ones(days)
+        matrix = np.asarray(self.SEASONALITY_MATRIX.get(profile, self.SEASONALITY_MATRIX['padrao']))
+        if mode == "start":
+            return np.full(days, matrix[start_date.month - 1])
+
+        nights = np.datetime64(start_date, 'D') + np.arange(days)
+        month_start = nights.astype('datetime64[M]')
+        months = month_start.astype(np.int64) % 12
+        if mode != "smooth":
+            return matrix[months]
+
+        # Posição contínua no ano: 0.0 = meio de janeiro, 11.0 = meio de dezembro
+        first_day = month_start.astype('datetime64[D]')
+        month_len = ((month_start + 1).astype('datetime64[D]') - first_day).astype(np.float64)
+        frac = ((nights - first_day).astype(np.float64) + 0.5) / month_len
+        pos = months + frac - 0.5
+        # Dezembro e janeiro se encontram na virada do ano
+        ring = np.concatenate(([matrix[-1]], matrix, [matrix[0]]))
+        return np.interp(pos, np.arange(-1, 13), ring)
+
+    def is_catalog_city(self, destination):
+        """True se o texto já casa com uma cidade da base (exato ou contido), sem tolerância a erros."""
+        return self.matcher.match(self._normalize(destination)) is not None
+
     def _normalize(self, text):
-        return ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn').lower().strip()
+        return matcher.normalize(text)
+
+    def get_data(self, destination, audit=None):
+        return self.lookup(destination, audit)[0]
+
+    def lookup(self, destination, audit=None):
+        """
+        (dados, transient). transient=True: o Nominatim estava indisponível e os dados são o padrão;
+        a cotação não deve ser memorizada (o geocache só guarda a falha por error_ttl).
+        """
+        with telemetry.stage('geo', audit) as entry:
+            path, data = self._resolve(destination)
+            entry['path'] = path
+        telemetry.count('takeitiz_geo_path_total', path=path)
+        return data, path == 'unavailable'
 
-    def get_data(self, destination):
-        self.audit = [] 
+    def _resolve(self, destination):
+        """Devolve (caminho, (idx, profile, modifiers)); o caminho alimenta o audit/telemetria."""
         dest_clean = self._normalize(destination)
         
-        for city_key, data in database.CITIES.items():
-            if self._normalize(city_key) == dest_clean or (len(city_key) > 4 and self._normalize(city_key) in dest_clean):
-                return data['idx'], data['profile'], data.get('modifiers', {})
+        hit = self.matcher.match(dest_clean)
+        if hit:
+            _, data = hit
+            return 'city', (data['idx'], data['profile'], data.get('modifiers', {}))
 
-        if "brasil" in dest_clean or "brazil" in dest_clean or any(x in dest_clean for x in [" sp", " rj", " mg", " rs", " ba"]):
-             return database.DEFAULTS['BR']['idx'], database.DEFAULTS['BR']['profile'], {}
-        if "usa" in dest_clean or "estados unidos" in dest_clean:
-            return database.DEFAULTS['US']['idx'], database.DEFAULTS['US']['profile'], {}
+        # Erro de digitação de cidade da base ("Buenos Aries", "florianopols"), se o trecho
+        # digitado não for, ele mesmo, um lugar do gazetteer
+        fuzzy = self.index.best_match(dest_clean)
+        if fuzzy and gazetteer.resolve(fuzzy[2]) is None:
+            _, data, _ = fuzzy
+            return 'fuzzy', (data['idx'], data['profile'], data.get('modifiers', {}))
 
-        try:
-            location = self.geolocator.geocode(destination, language='en', timeout=2)
-            if location:
-                address = location.raw.get('address', {})
-                country = address.get('country_code', '').lower()
-                state = address.get('state', '').lower()
-                
-                profile = 'padrao'
-                if country in ['br', 'ar', 'uy', 'cl']: profile = 'sul_tropical'
-                elif country in ['us', 'gb', 'fr', 'es', 'it', 'de']: profile = 'norte_temperado'
-                elif 'florida' in state: profile = 'inverno_fugitivo'
-                
-                idx = 100
-                if country == 'us': idx = 140
-                elif country in ['gb', 'fr', 'ch']: idx = 120
-                elif profile == 'norte_temperado': idx = 115
-                elif profile == 'sul_tropical': idx = 95
-                
-                return idx, profile, {}
-        except: pass
-
-        return 100, 'padrao', {}
+        # Países, estados e regiões conhecidos: resolvidos offline, sem rede
+        region = gazetteer.resolve(dest_clean)
+        if region:
+            idx, profile = region
+            return 'gazetteer', (idx, profile, {})
+
+        # Cauda longa: Nominatim, via cache persistente + limitador (1 req/s)
+        place, transient = self.geocache.lookup_status(dest_clean, partial(self._geocode, destination))
+        if place:
+            country = place.get('country_code', '')
+            state = place.get('state', '')
+            
+            profile = 'padrao'
+            if country in ['br', 'ar', 'uy', 'cl']: profile = 'sul_tropical'
+            elif country in ['us', 'gb', 'fr', 'es', 'it', 'de']: profile = 'norte_temperado'
+            elif 'florida' in state: profile = 'inverno_fugitivo'
+            
+            idx = 100
+            if country == 'us': idx = 140
+            elif country in ['gb', 'fr', 'ch']: idx = 120
+            elif profile == 'norte_temperado': idx = 115
+            elif profile == 'sul_tropical': idx = 95
+            
+            return 'geocode', (idx, profile, {})
+
+        # 'unavailable': falha temporária (erro, limitador, circuito aberto); 'default': lugar inexistente
+        return 'unavailable' if transient else 'default', (100, 'padrao', {})
+
+    def _geocode(self, destination):
+        """Consulta de rede. Devolve só o que o cálculo usa (país/estado) ou None se não existir."""
+        with telemetry.stage('geocode_http'):
+            location = self.geolocator.geocode(destination, language='en', addressdetails=True, timeout=2)
+        if not location:
+            return None
+        address = location.raw.get('address', {})
+        return {
+            'country_code': address.get('country_code', '').lower(),
+            'state': address.get('state', '').lower(),
+        }
 
 # --- 5. HOTELARIA ---
 class AccommodationProvider:
+    BASE_HOTEL_USD = 120.0
+    STYLE_SLOPE = 1.6    # quanto a diária sobe com o percentil de hotel do estilo
+    STYLE_PIVOT = 0.45   # percentil que paga a diária-base
+
     def estimate_adr(self, price_index, style_pct):
-        BASE_HOTEL_USD = 120.0
         city_factor = price_index / 100.0
-        style_factor = np.exp(1.6 * (style_pct - 0.45))
-        return BASE_HOTEL_USD * city_factor * style_factor
+        style_factor = np.exp(self.STYLE_SLOPE * (style_pct - self.STYLE_PIVOT))
+        return self.BASE_HOTEL_USD * city_factor * style_factor
+
+    def model_params(self):
+        """Constantes de estimate_adr (entram na impressão digital da tabela de preços)."""
+        return {'base_hotel_usd': self.BASE_HOTEL_USD, 'style_slope': self.STYLE_SLOPE, 'style_pivot': self.STYLE_PIVOT}
 
 # --- 6. MOTOR ---
+# Pool compartilhado para consultar câmbio e geolocalização em paralelo
+_PROVIDER_POOL = ThreadPoolExecutor(max_workers=config.PROVIDER_POOL_SIZE, thread_name_prefix="takeitiz-provider")
+
+GEO_DEFAULT = (100, 'padrao', {})
+
 class CostEngine:
     def __init__(self):
         self.fx = FXProvider()
         self.geo = GeoCostProvider()
         self.hotel = AccommodationProvider()
+        # Núcleo em USD memorizado: trocar só a moeda custa uma multiplicação
+        self.quote_cache = LRUCache(maxsize=config.QUOTE_CACHE_SIZE, ttl=config.QUOTE_CACHE_TTL_SECONDS)
+        telemetry.add_collector(self._quote_memo_metrics)
+        # Cidades da base: tabela NumPy pré-compilada (refeita se a base/modelo mudar)
+        self.grid = pricegrid.AutoPriceGrid(self._model_inputs, self.hotel.estimate_adr, on_rebuild=self._on_grid_rebuild,
+                                            adr_params=self.hotel.model_params)
 
-    def calculate_cost(self, destination, days, travelers, style, currency, vibe="tourist_mix", start_date=None):
-        usd_rate = self.fx.get_rate(currency)
-        idx, profile, modifiers = self.geo.get_data(destination)
-        
-        season_factor = 1.0
-        if start_date:
-            matrix = self.geo.SEASONALITY_MATRIX.get(profile, self.geo.SEASONALITY_MATRIX['padrao'])
-            season_factor = matrix[start_date.month - 1]
+    def _model_inputs(self):
+        return {
+            'cities': destdb.current().cities,  # snapshot: a tabela nunca mistura duas versões
+            'anchor': BASE_SPEND_USD_ANCHOR,
+            'styles': StyleConfig.SETTINGS,
+            'vibes': VibeConfig.MULTIPLIERS,
+            'seasonality': self.geo.SEASONALITY_MATRIX,
+        }
 
+    def _quote_memo_metrics(self):
+        stats = self.quote_cache.stats()
+        return [('takeitiz_quote_memo_total', 'counter', {'result': 'hit'}, stats['hits']),
+                ('takeitiz_quote_memo_total', 'counter', {'result': 'miss'}, stats['misses']),
+                ('takeitiz_quote_memo_total', 'counter', {'result': 'eviction'}, stats['evictions']),
+                ('takeitiz_quote_memo_entries', 'gauge', {}, stats['size'])]
+
+    def _on_grid_rebuild(self, grid):
+        # Base mudou: índice de destinos novo e nenhum orçamento memorizado com preço antigo
+        self.geo.set_cities(grid.cities)
+        self.quote_cache.clear()
+
+    def _fetch_inputs(self, destination, currency, deadline=None, need_geo=True):
+        """
+        Câmbio e geo rodam ao mesmo tempo sob um único prazo.
+        Quem estourar o prazo (ou falhar, ou achar o upstream indisponível) cai no valor padrão
+        e entra na lista 'defaulted'.
+        """
+        if deadline is None: deadline = config.QUOTE_DEADLINE_SECONDS
+        # Cada cotação tem suas próprias listas: threads atrasadas nunca escrevem no audit de outra
+        fx_audit, geo_audit = [], []
+        fx_future = _PROVIDER_POOL.submit(self.fx.get_rate, currency, fx_audit)
+        futures = [fx_future]
+        geo_future = None
+        if need_geo:
+            geo_future = _PROVIDER_POOL.submit(self.geo.lookup, destination, geo_audit)
+            futures.append(geo_future)
+        done, _ = wait(futures, timeout=deadline)
+
+        defaulted = []
+        audit = []
+        if fx_future in done and fx_future.exception() is None:
+            usd_rate = fx_future.result()
+            audit += fx_audit
+        else:
+            usd_rate = FXProvider.fallback_rate(currency)
+            defaulted.append('fx')
+
+        geo_data = None
+        if geo_future is not None:
+            if geo_future in done and geo_future.exception() is None:
+                geo_data, transient = geo_future.result()
+                audit += geo_audit
+                if transient:
+                    # Nominatim indisponível (erro, limitador, circuito): padrão, e a cotação não é memorizada
+                    defaulted.append('geo')
+            else:
+                geo_data = GEO_DEFAULT
+                defaulted.append('geo')
+
+        for future, name in ((fx_future, 'fx'), (geo_future, 'geo')):
+            if future is not None and future in done and future.exception() is not None:
+                telemetry.suppressed(name, future.exception(), audit)
+        for name in defaulted:
+            telemetry.count('takeitiz_defaulted_total', provider=name)
+            audit.append({'stage': name, 'defaulted': True})
+        if defaulted:
+            logging.warning("Cotação com valores padrão (%s) para %r", ", ".join(defaulted), destination)
+        return usd_rate, geo_data, defaulted, audit
+
+    async def calculate_cost_async(self, *args, **kwargs):
+        """Variante asyncio: mesma cotação, sem bloquear o event loop."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.calculate_cost, *args, **kwargs))
+
+    @staticmethod
+    def _style_key(style):
         style_key = style.lower()
         if "super" in style_key: style_key = "super_luxo"
         elif "econ" in style_key: style_key = "econômico"
-        
+        return style_key
+
+    def calculate_cost(self, destination, days, travelers, style, currency, vibe="tourist_mix", start_date=None, seasonality="start", deadline=None):
+        style_key = self._style_key(style)
+        vibe_key = vibe.lower()
+
+        t0 = time.perf_counter()
+        dest_clean = matcher.normalize(destination)
+        key = (dest_clean, days, travelers, style_key, vibe_key, start_date, seasonality)
+        core = self.quote_cache.get(key)
+        cache_state = 'miss' if core is None else 'hit'
+        telemetry.count('takeitiz_quotes_total', cache=cache_state)
+        grid_audit = []
+        grid_hit = self._grid_lookup(dest_clean, grid_audit) if core is None else None
+        usd_rate, geo_data, defaulted, audit = self._fetch_inputs(destination, currency, deadline,
+                                                                  need_geo=core is None and grid_hit is None)
+        audit += grid_audit
+        if core is None:
+            with telemetry.stage('compute', audit) as entry:
+                if grid_hit:
+                    entry['path'] = 'grid'
+                    core = self._grid_core(*grid_hit, days, travelers, style_key, vibe_key, start_date, seasonality)
+                else:
+                    core = self._usd_core(geo_data, days, travelers, style_key, vibe_key, start_date, seasonality)
+            # Geo caiu no padrão (prazo ou Nominatim indisponível): não memoriza um orçamento degradado
+            if 'geo' not in defaulted:
+                self.quote_cache.set(key, core)
+
+        elapsed = time.perf_counter() - t0
+        telemetry.REGISTRY.observe('takeitiz_stage_seconds', elapsed, stage='quote')
+        audit.append({'stage': 'quote', 'cache': cache_state, 'ms': round(elapsed * 1000, 3)})
+
+        return {
+            "total": core['total'] * usd_rate,
+            "daily_avg": core['daily_avg'] * usd_rate,
+            "defaulted": defaulted,
+            "audit": audit,
+            "breakdown": {cat: val * usd_rate for cat, val in core['breakdown'].items()}
+        }
+
+    def _grid_lookup(self, dest_clean, audit):
+        """(grid, linha) se o destino é cidade da base; resolvido na hora, sem ir ao pool de provedores."""
+        grid = self.grid.get()
+        t0 = time.perf_counter()
+        hit = self.geo.matcher.match(dest_clean)
+        row = grid.row(hit[0]) if hit else None
+        if row is None:
+            return None
+        # Só conta como etapa 'geo' quando resolve; senão o GeoCostProvider mede a etapa inteira
+        elapsed = time.perf_counter() - t0
+        telemetry.REGISTRY.observe('takeitiz_stage_seconds', elapsed, stage='geo')
+        telemetry.count('takeitiz_geo_path_total', path='city')
+        audit.append({'stage': 'geo', 'path': 'city', 'ms': round(elapsed * 1000, 3)})
+        return grid, row
+
+    def _grid_season(self, grid, row, days, start_date, seasonality):
+        if seasonality == "start" or not start_date:
+            slot = start_date.month - 1 if start_date else pricegrid.NO_SEASON
+            return np.full(days, grid.season[row, slot])
+        return self.geo.season_factors(grid.profiles[row], start_date, days, seasonality)
+
+    @staticmethod
+    def _grid_axes(grid, style_key, vibe_key):
+        return (grid.styles.get(style_key, grid.styles['moderado']),
+                grid.vibes.get(vibe_key, grid.vibes['tourist_mix']))
+
+    def _grid_core(self, grid, row, days, travelers, style_key, vibe_key, start_date, seasonality):
+        """Orçamento em USD lido da tabela pré-compilada (mesmo resultado de _usd_core)."""
+        s, v = self._grid_axes(grid, style_key, vibe_key)
+        season = self._grid_season(grid, row, days, start_date, seasonality)
+        return self._assemble(grid.life[row, s, v], grid.adr[row, s], season, days, travelers)
+
+    def suggest_destinations(self, text, limit=None):
+        """Sugestões de autocompletar [(chave, nome, score)] a partir do índice em memória (sem rede)."""
+        return self.geo.index.suggest(text, limit)
+
+    def rank_destinations(self, budget, days, travelers, style, currency, vibe="tourist_mix", start_date=None,
+                          seasonality="start", k=10, mode="cheapest", deadline=None, grid=None):
+        """
+        "Para onde dá pra ir com esse orçamento": todas as cidades da base numa única passada vetorizada.
+        mode: 'cheapest' -> as k mais baratas que cabem no orçamento
+              'fit'      -> as k que mais aproveitam o orçamento (mais perto do teto, sem passar)
+        Seleção por np.argpartition (O(n)); só as k escolhidas são ordenadas.
+        Devolve {'results': [{destination, total, daily_avg, budget_share}], 'matches', 'cheapest', 'defaulted', 'audit'}.
+        """
+        t0 = time.perf_counter()
+        grid = grid or self.grid.get()
+        usd_rate, _, defaulted, audit = self._fetch_inputs("ranking", currency, deadline, need_geo=False)
+
+        with telemetry.stage('rank', audit) as entry:
+            s, v = self._grid_axes(grid, self._style_key(style), vibe.lower())
+            # Sazonalidade por perfil climático (poucos), espalhada para as cidades pelo índice
+            nights = np.array([self._grid_season(grid, row, days, start_date, seasonality).sum()
+                               for row in grid.profile_rows.values()])
+            season_nights = nights[grid.profile_ids]
+            life_nights = days + (season_nights - days) * 0.5
+            rooms = math.ceil(travelers / 2)
+            # Mesmas operações de _assemble, elemento a elemento: total igual ao de calculate_cost
+            final = grid.adr[:, s] * rooms * season_nights + grid.life[:, s, v, -1] * (travelers * life_nights)
+            totals = final * usd_rate
+
+            # Apelidos ("london" -> "londres") não viram uma segunda opção no ranking
+            fits = (totals <= budget) & grid.primary
+            matches = int(np.count_nonzero(fits))
+            score = totals if mode == "cheapest" else budget - totals
+            score = np.where(fits, score, np.inf)
+            top = min(k, matches)
+            if top == 0:
+                chosen = np.empty(0, dtype=np.intp)
+            elif top < len(score):
+                chosen = np.argpartition(score, top - 1)[:top]
+            else:
+                chosen = np.arange(len(score))
+            chosen = chosen[np.argsort(score[chosen], kind="stable")][:top]
+            entry['cities'] = len(totals)
+            entry['matches'] = matches
+
+        cheapest = int(np.argmin(np.where(grid.primary, totals, np.inf))) if grid.primary.any() else None
+        telemetry.count('takeitiz_rankings_total', mode=mode)
+        elapsed = time.perf_counter() - t0
+        telemetry.REGISTRY.observe('takeitiz_stage_seconds', elapsed, stage='ranking')
+        audit.append({'stage': 'ranking', 'ms': round(elapsed * 1000, 3)})
+
+        def item(i):
+            total = float(totals[i])
+            return {
+                'destination': grid.names[i],
+                'total': total,
+                'daily_avg': (float(final[i]) / days) / travelers * usd_rate,
+                'budget_share': total / budget if budget else math.inf,
+            }
+
+        return {
+            'results': [item(i) for i in chosen],
+            'matches': matches,
+            'cheapest': item(cheapest) if cheapest is not None else None,
+            'defaulted': defaulted,
+            'audit': audit,
+        }
+
+    def _usd_core(self, geo_data, days, travelers, style_key, vibe_key, start_date, seasonality):
+        """Orçamento completo em USD (independente de câmbio)."""
+        idx, profile, modifiers = geo_data
+
+        # Fator sazonal por noite (NumPy): viagens longas custam o mesmo que um fim de semana
+        season = self.geo.season_factors(profile, start_date, days, seasonality)
+
         style_cfg = StyleConfig.SETTINGS.get(style_key, StyleConfig.SETTINGS['moderado'])
-        vibe_mult = VibeConfig.MULTIPLIERS.get(vibe.lower(), VibeConfig.MULTIPLIERS['tourist_mix'])
+        vibe_mult = VibeConfig.MULTIPLIERS.get(vibe_key, VibeConfig.MULTIPLIERS['tourist_mix'])
         
         breakdown_usd = {}
         daily_life_usd = 0
         
         for cat, base in BASE_SPEND_USD_ANCHOR.items():
-            life_season = 1 + (season_factor - 1) * 0.5
             cat_mod = modifiers.get(cat, 1.0) 
-            val = base * (idx / 100.0) * style_cfg['factor'] * vibe_mult[cat] * life_season * cat_mod
+            val = base * (idx / 100.0) * style_cfg['factor'] * vibe_mult[cat] * cat_mod
             breakdown_usd[cat] = val
             daily_life_usd += val
             
-        rooms = math.ceil(travelers / 2)
         lodging_mod = modifiers.get('lodging', 1.0)
-        adr_usd = self.hotel.estimate_adr(idx, style_cfg['hotel_pct']) * season_factor * lodging_mod
-        
-        total_hotel = adr_usd * rooms * days
-        final = (total_hotel + (daily_life_usd * travelers * days)) * usd_rate
+        adr_usd = self.hotel.estimate_adr(idx, style_cfg['hotel_pct']) * lodging_mod
+
+        life = (breakdown_usd['food'], breakdown_usd['transport'],
+                breakdown_usd['activities'] + breakdown_usd['nightlife'], breakdown_usd['misc'], daily_life_usd)
+        return self._assemble(life, adr_usd, season, days, travelers)
+
+    def _assemble(self, life, adr_usd, season, days, travelers):
+        """Escala o gasto diário por pessoa (colunas de pricegrid.LIFE_COLUMNS) e a diária por quarto."""
+        food, transport, activities, misc, daily_life_usd = life
+        season_nights = season.sum()
+        life_nights = days + (season_nights - days) * 0.5
+
+        rooms = math.ceil(travelers / 2)
+        total_hotel = adr_usd * rooms * season_nights
+        life_total = travelers * life_nights
+        final = total_hotel + (daily_life_usd * life_total)
         
         return {
             "total": final,
             "daily_avg": (final / days) / travelers,
             "breakdown": {
-                'lodging': total_hotel * usd_rate,
-                'food': breakdown_usd['food'] * travelers * days * usd_rate,
-                'transport': breakdown_usd['transport'] * travelers * days * usd_rate,
-                'activities': (breakdown_usd['activities'] + breakdown_usd['nightlife']) * travelers * days * usd_rate,
-                'misc': breakdown_usd['misc'] * travelers * days * usd_rate
+                'lodging': total_hotel,
+                'lodging_nightly': adr_usd * rooms * season,
+                'food': food * life_total,
+                'transport': transport * life_total,
+                'activities': activities * life_total,
+                'misc': misc * life_total
             }
         }
 
 engine = CostEngine()
+telemetry.start_exporters()
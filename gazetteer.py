@@ -0,0 +1,85 @@
+# gazetteer.py
+# Gazetteer offline: países, estados, regiões e apelidos comuns -> (idx, perfil sazonal).
+# Resolve no próprio processo entradas como "Nordeste", "Toscana" ou "Patagônia";
+# o Nominatim fica só para a cauda longa de lugares.
+
+import csv
+import os
+import re
+import threading
+
+from matcher import normalize
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+
+# Quanto mais específico o lugar, maior a prioridade ("Toscana, Itália" -> Toscana)
+KIND_RANK = {'continent': 0, 'country': 1, 'state': 2, 'region': 3}
+
+# Nomes que também são palavras comuns em PT ("viagem para Toronto" não é o Pará)
+STOPWORDS = {'para'}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class Gazetteer:
+    def __init__(self, path=GAZETTEER_PATH):
+        self.path = path
+        self._phrases = None  # frase normalizada -> (rank, n_palavras, idx, profile)
+        self._codes = None    # sigla ("sp", "rj") -> (rank, 1, idx, profile)
+        self._max_words = 1
+        self._lock = threading.Lock()
+
+    def _load(self):
+        phrases, codes = {}, {}
+        max_words = 1
+        with open(self.path, encoding="utf-8", newline="") as fh:
+            for row in csv.DictReader(fh):
+                rank = KIND_RANK[row['kind']]
+                idx, profile = int(row['idx']), row['profile']
+                names = [row['name']] + [a for a in row['aliases'].split('|') if a]
+                for name in names:
+                    words = _TOKEN.findall(normalize(name))
+                    phrase = ' '.join(words)
+                    if not phrase or phrase in STOPWORDS:
+                        continue
+                    entry = (rank, len(words), idx, profile)
+                    if phrase not in phrases or entry[:2] > phrases[phrase][:2]:
+                        phrases[phrase] = entry
+                    max_words = max(max_words, len(words))
+                for code in filter(None, row['codes'].split('|')):
+                    codes[code.strip().lower()] = (rank, 1, idx, profile)
+        self._codes = codes
+        self._max_words = max_words
+        self._phrases = phrases  # publicado por último: sinaliza que o índice está pronto
+
+    def _ensure_loaded(self):
+        if self._phrases is None:
+            with self._lock:
+                if self._phrases is None:
+                    self._load()
+
+    def resolve(self, dest_clean):
+        """Recebe o destino normalizado. Retorna (idx, profile) do lugar mais específico ou None."""
+        self._ensure_loaded()
+        words = _TOKEN.findall(dest_clean)
+        best = None
+        for i in range(len(words)):
+            for n in range(min(self._max_words, len(words) - i), 0, -1):
+                entry = self._phrases.get(' '.join(words[i:i + n]))
+                if entry and (best is None or entry[:2] > best[:2]):
+                    best = entry
+            # Siglas de estado só valem depois do nome da cidade ("Ilhabela SP", não "SP")
+            if i > 0:
+                entry = self._codes.get(words[i])
+                if entry and (best is None or entry[:2] > best[:2]):
+                    best = entry
+        if best is None:
+            return None
+        return best[2], best[3]
+
+
+_SHARED = Gazetteer()
+
+
+def resolve(dest_clean):
+    return _SHARED.resolve(dest_clean)
@@ -0,0 +1,147 @@
+# geocache.py
+# Cache de geocodificação (Nominatim) sobre o cache em camadas (cache.TieredCache).
+# - Chave = destino normalizado; TTL longo e cache negativo para falhas (config.CACHE_POLICIES['geocode']).
+# - Single-flight: buscas simultâneas pela mesma chave viram uma única requisição.
+# - Token bucket: respeita a política de 1 requisição/segundo do Nominatim.
+# - Circuit breaker (resilience): com o Nominatim fora, a cotação cai no padrão na hora, sem timeout.
+
+import logging
+import threading
+import time
+
+import config
+import resilience
+import telemetry
+from cache import TieredCache
+
+
+class TokenBucket:
+    """Limitador clássico: `rate` fichas por segundo, acumulando até `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Bloqueia até conseguir uma ficha. Retorna False se `timeout` vencer antes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class _Flight:
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+# Valor guardado no lugar da resposta quando o Nominatim falhou (error_ttl): distingue
+# "indisponível agora" de "lugar inexistente" (None) também nos hits seguintes
+UNAVAILABLE = {'unavailable': True}
+
+
+class GeocodeCache:
+    """
+    lookup(key, fetch) devolve o dict salvo para `key` ou None (não encontrado ou indisponível).
+    lookup_status(key, fetch) devolve (payload, transient): transient=True quando o None veio de
+    falha temporária (erro, limitador, circuito aberto), não de uma resposta do Nominatim.
+    `fetch()` só é chamado em cache miss; deve devolver um dict, None (lugar inexistente)
+    ou levantar exceção (falha temporária, cacheada por pouco tempo).
+    """
+
+    def __init__(self, store=None, limiter=None, breaker=None, offline=False):
+        self.store = store or TieredCache('geocode')
+        self.limiter = limiter or NOMINATIM_LIMITER
+        self.breaker = breaker or resilience.breaker('nominatim')
+        # offline: só lê o cache, nunca chama o Nominatim (ex: workers do lote, que não dividem o limitador)
+        self.offline = offline
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def _fetch_and_store(self, key, fetch):
+        if self.offline:
+            telemetry.count('takeitiz_geocode_cache_total', result='offline')
+            return None, True
+        # Circuito aberto: nem entra na fila do limitador. Não cacheia (não é resposta do Nominatim)
+        if not self.breaker.ready():
+            telemetry.count('takeitiz_geocode_cache_total', result='circuit_open')
+            return None, True
+        if not self.limiter.acquire(timeout=config.GEOCODE_LIMITER_WAIT_SECONDS):
+            # Fila do limitador cheia: não cacheia, a próxima cotação tenta de novo
+            logging.warning("Geocode: limite de requisições atingido para %r", key)
+            telemetry.count('takeitiz_geocode_cache_total', result='rate_limited')
+            return None, True
+        try:
+            payload = self.breaker.call(fetch)  # None (lugar inexistente) é sucesso
+        except resilience.CircuitOpenError:
+            telemetry.count('takeitiz_geocode_cache_total', result='circuit_open')
+            return None, True
+        except Exception as exc:
+            telemetry.suppressed('geo.nominatim', exc)
+            self.store.set(key, UNAVAILABLE, kind='error_ttl')
+            return None, True
+        self.store.set(key, payload, kind='ttl' if payload is not None else 'negative_ttl')
+        return payload, False
+
+    def lookup(self, key, fetch):
+        return self.lookup_status(key, fetch)[0]
+
+    def lookup_status(self, key, fetch):
+        found, payload = self.store.get(key)
+        if found:
+            if payload == UNAVAILABLE:
+                telemetry.count('takeitiz_geocode_cache_total', result='error_hit')
+                return None, True
+            telemetry.count('takeitiz_geocode_cache_total', result='hit' if payload is not None else 'negative_hit')
+            return payload, False
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            telemetry.count('takeitiz_geocode_cache_total', result='coalesced')
+            flight.event.wait()
+            return flight.result
+
+        telemetry.count('takeitiz_geocode_cache_total', result='miss')
+        flight.result = (None, True)  # se o fetch estourar, quem esperava vê "indisponível"
+        try:
+            flight.result = self._fetch_and_store(key, fetch)
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+        return flight.result
+
+
+# Limitador e cache únicos por processo (todas as sessões disputam o mesmo 1 req/s)
+NOMINATIM_LIMITER = TokenBucket(rate=config.GEOCODE_RATE_PER_SECOND, capacity=1)
+
+_SHARED = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_cache():
+    global _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            _SHARED = GeocodeCache()
+        return _SHARED
@@ -0,0 +1,212 @@
+# linkexport.py
+# Exportação em lote dos links do concierge (Booking/Viator/Google) para campanhas de marketing.
+# Uma linha por destino x mês x estilo x vibe, em JSONL ou CSV, gravada em streaming.
+#
+# Uso:
+#   python linkexport.py -o links.jsonl                          # base inteira, próximos 12 meses
+#   python linkexport.py -o links.csv --format csv --year 2027 --days 5
+#   python linkexport.py -o - --destinations paris,lisboa --styles luxo --vibes gastro,festa
+#   (estilos/vibes/destinos sem acento ou em maiúsculas valem; valor desconhecido é erro)
+#
+# Cada destino vira uma tarefa num pool de processos; o processo principal mantém no máximo
+# `--window` tarefas em voo e grava na ordem de entrada, então a memória não cresce com o
+# número de combinações. Links que só dependem do destino são montados uma vez por tarefa.
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import amenities
+from matcher import normalize
+
+LINK_KEYS = ("flight", "hotel", "food", "insurance", "shopping", "night", "culture", "nature", "event", "attr")
+CSV_COLUMNS = ["destination", "name", "start_date", "days", "style", "vibe"] + list(LINK_KEYS)
+
+_GEN = None
+
+
+def _generator():
+    # Um gerador (e seus templates pré-codificados) por processo
+    global _GEN
+    if _GEN is None:
+        _GEN = amenities.AmenitiesGenerator()
+    return _GEN
+
+
+def all_styles():
+    return list(_generator().STYLE_TERMS)
+
+
+def all_vibes():
+    return ["tourist_mix"] + list(_generator().VIBE_FOOD_TERMS)
+
+
+def month_starts(year=None, day=1, count=12):
+    """Datas de ida: `day` (1-28, existe em todo mês) de cada mês. Sem `year`, os próximos `count` meses."""
+    if year is not None:
+        return [date(year, m, day) for m in range(1, 13)]
+    today = date.today()
+    out = []
+    for i in range(1, count + 1):
+        y, m = divmod(today.month - 1 + i, 12)
+        out.append(date(today.year + y, m + 1, day))
+    return out
+
+
+def export_destination(task):
+    """Todas as combinações de um destino, já serializadas (um bloco de texto)."""
+    key, name, starts, days, styles, vibes, fmt = task
+    templates = _generator().templates
+    dest_links = templates.destination_links(name)  # cache por destino: voos, Viator, coworking
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n") if fmt == "csv" else None
+    for start in starts:
+        start_iso = start.isoformat()
+        for style in styles:
+            for vibe in vibes:
+                links = templates.render(dest_links, style, vibe, start, days)
+                if writer:
+                    writer.writerow([key, name, start_iso, days, style, vibe] + [links[k]["url"] for k in LINK_KEYS])
+                else:
+                    buf.write(json.dumps({
+                        "destination": key, "name": name, "start_date": start_iso, "days": days,
+                        "style": style, "vibe": vibe, "links": {k: links[k]["url"] for k in LINK_KEYS},
+                    }, ensure_ascii=False))
+                    buf.write("\n")
+    return buf.getvalue()
+
+
+def export(out, destinations, starts, days, styles, vibes, fmt="jsonl", workers=None, window=None):
+    """
+    Grava em `out` (arquivo texto) e devolve o número de linhas.
+    destinations: [(chave, nome)]. workers=0 roda no próprio processo.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    window = window or max(2, 2 * workers)
+    if fmt == "csv":
+        csv.writer(out, lineterminator="\n").writerow(CSV_COLUMNS)
+    per_destination = len(starts) * len(styles) * len(vibes)
+    tasks = ((key, name, starts, days, styles, vibes, fmt) for key, name in destinations)
+
+    rows = 0
+    if workers == 0:
+        for task in tasks:
+            out.write(export_destination(task))
+            rows += per_destination
+        return rows
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(export_destination, task))
+            if len(pending) >= window:
+                out.write(pending.popleft().result())
+                rows += per_destination
+        while pending:
+            out.write(pending.popleft().result())
+            rows += per_destination
+    return rows
+
+
+def catalog_destinations(only=None):
+    """[(chave, nome)] das cidades da base (sem apelidos), na ordem do CSV."""
+    import destdb
+    cities = destdb.current().cities
+    wanted = set(only) if only else None
+    return [
+        (key, data.get("name") or key)
+        for key, data in cities.items()
+        if not data.get("alias_of") and (wanted is None or key in wanted)
+    ]
+
+
+def _split(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+
+def _resolve(values, canonical):
+    """Mapeia valores digitados para as chaves canônicas (sem acento/caixa). Devolve (chaves, desconhecidos)."""
+    keys, unknown = [], []
+    for value in values:
+        key = canonical.get(normalize(value))
+        if key is None:
+            unknown.append(value)
+        elif key not in keys:
+            keys.append(key)
+    return keys, unknown
+
+
+def resolve_styles(values):
+    # Mesma sanitização do AmenitiesGenerator ('Super Luxo' -> super_luxo, 'econ' -> econômico)
+    gen = _generator()
+    canonical = {normalize(key): key for key in all_styles()}
+    return _resolve([gen._keys(v, "tourist_mix")[0] for v in values], canonical)
+
+
+def resolve_vibes(values):
+    return _resolve(values, {normalize(key): key for key in all_vibes()})
+
+
+def resolve_destinations(values):
+    """Chaves (ou apelidos) da base -> chaves principais."""
+    import destdb
+    cities = destdb.current().cities
+    canonical = {key: data.get("alias_of") or key for key, data in cities.items()}
+    return _resolve(values, canonical)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta links do concierge para campanhas")
+    parser.add_argument("-o", "--out", required=True, help="arquivo de saída ('-' = stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None, help="padrão: pela extensão do arquivo")
+    parser.add_argument("--year", type=int, help="ano das datas de ida (padrão: próximos 12 meses)")
+    parser.add_argument("--day", type=int, default=1, choices=range(1, 29), metavar="1-28", help="dia do mês da ida")
+    parser.add_argument("--days", type=int, default=7, help="duração da viagem (diárias)")
+    parser.add_argument("--destinations", help="chaves separadas por vírgula (padrão: base inteira)")
+    parser.add_argument("--styles", help="estilos separados por vírgula (padrão: todos)")
+    parser.add_argument("--vibes", help="vibes separadas por vírgula (padrão: todas)")
+    parser.add_argument("--workers", type=int, default=None, help="processos (0 = sem pool; padrão: núcleos)")
+    parser.add_argument("--window", type=int, default=None, help="destinos em voo (limita a memória)")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.out.endswith(".csv") else "jsonl")
+    def chosen(value, resolve, what, valid=None):
+        # Valor desconhecido é erro: nunca exporta links com o padrão rotulados com outro estilo/vibe
+        values = _split(value)
+        if not values:
+            return None
+        keys, unknown = resolve(values)
+        if unknown:
+            parser.error(f"{what} desconhecido(s): {', '.join(unknown)}" + (f" (válidos: {', '.join(valid)})" if valid else ""))
+        return keys
+
+    destinations = catalog_destinations(chosen(args.destinations, resolve_destinations, "destino"))
+    starts = month_starts(args.year, args.day)
+    styles = chosen(args.styles, resolve_styles, "estilo", all_styles()) or all_styles()
+    vibes = chosen(args.vibes, resolve_vibes, "vibe", all_vibes()) or all_vibes()
+
+    t0 = time.perf_counter()
+    if args.out == "-":
+        rows = export(sys.stdout, destinations, starts, args.days, styles, vibes, fmt, args.workers, args.window)
+    else:
+        # Escrita atômica: a landing page nunca lê um export pela metade
+        tmp = f"{args.out}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as fh:
+            rows = export(fh, destinations, starts, args.days, styles, vibes, fmt, args.workers, args.window)
+        os.replace(tmp, args.out)
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {rows} combinações ({len(destinations)} destinos) em {elapsed:.2f} s "
+          f"({rows / elapsed if elapsed else 0:.0f}/s) -> {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
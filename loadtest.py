@@ -0,0 +1,368 @@
+# loadtest.py
+# Teste de carga do app.py: várias sessões simultâneas do Streamlit, sem navegador e sem rede.
+# Cada sessão é um AppTest (streamlit.testing) rodando numa thread, como o servidor faz com
+# cada aba aberta, seguindo roteiros de uso reais sobre os dublês offline do bench.py.
+#
+# Uso:
+#   python loadtest.py                                   # 10 sessões, 30 s
+#   python loadtest.py --sessions 50 --duration 60 --think 1.0
+#   python loadtest.py --mix quote=6,typo=2,budget=2 --json loadtest.json
+#
+# Mede a latência de cada rerun (p50/p95/p99 por etapa do roteiro), o throughput (reruns/s e
+# roteiros/s) e a memória por sessão (RSS do processo com as N sessões abertas, menos a linha de base).
+# A latência inclui o overhead do AppTest (montar a árvore de elementos), um pouco acima do servidor real.
+# Requer streamlit >= 1.57 (AppTest com st.pills); versão sem os internos esperados aborta com ❌.
+
+import argparse
+import contextlib
+import gc
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import bench
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+CITIES = ["Paris", "Lisboa", "Rio de Janeiro", "Nova York", "Buenos Aires", "Roma", "Tóquio", "Florianópolis"]
+PLACES = ["Toscana", "Nordeste", "Patagônia", "Vilarejo Fixo"]  # gazetteer e geocode (dublê)
+TYPOS = ["Buenos Aries", "florianopols", "Amsterdan", "Barcelnoa"]
+CURRENCIES = ["BRL", "BRL", "USD", "EUR", "ARS"]
+STYLES = ["Econômico", "Moderado", "Conforto", "Luxo", "Super Luxo (Exclusivo)"]
+VIBES = ["Cultura (História/Arte)", "Gastro (Comer Bem)", "Festa (Vida Noturna)", "Business (A Trabalho)"]
+CONCIERGE = ["Compras", "Vida Noturna", "Arte & Cultura", "Natureza"]
+
+# isolate_apptest() troca internos do AppTest (não são API pública). Conferido de STREAMLIT_MIN
+# até STREAMLIT_TESTED; fora disso falha (ou avisa) em vez de medir errado. O app roda desde o piso
+# do requirements.txt (1.52), mas o AppTest só enxerga st.pills (roteiro de sugestão) a partir da 1.57.
+STREAMLIT_MIN = (1, 57)
+STREAMLIT_TESTED = (1, 66)
+APPTEST_INTERNALS = {
+    "app_test": ("AppTest", "Runtime", "MediaFileManager", "MemoryMediaFileStorage", "MemoryCacheStorageManager",
+                 "ScriptCache", "BidiComponentManager", "patch_config_options"),
+    "local_script_runner": ("ScriptCache",),
+    "util": ("config", "build_mock_config_get_option"),
+}
+
+
+def rss_mib():
+    """RSS atual do processo (Linux: /proc), senão o pico (ru_maxrss)."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _widget(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"widget {label!r} não encontrado")
+
+
+def _dates(rng):
+    start = date.today() + timedelta(days=rng.randint(15, 300))
+    return [start, start + timedelta(days=rng.randint(2, 20))]
+
+
+def _pick_suggestion(at):
+    if not at.pills:
+        return False  # nada a sugerir (a etapa é pulada, não é erro)
+    at.pills[0].set_value(at.pills[0].options[0])
+
+
+# --- 1. ROTEIROS ---
+# Cada etapa: (nome, ação). A ação mexe num widget; o harness mede o rerun (at.run()) que vem depois.
+# Ação que devolve False não gera rerun (ex: não apareceu sugestão).
+def journey_quote(rng):
+    """Já sabe o destino: preenche tudo, calcula, escolhe extras do concierge e ajusta o número de pessoas."""
+    return [
+        ("destino", lambda at: at.text_input(key="dest_input").set_value(rng.choice(CITIES + PLACES))),
+        ("datas", lambda at: at.date_input[0].set_value(_dates(rng))),
+        ("moeda", lambda at: _widget(at.selectbox, "Moeda").set_value(rng.choice(CURRENCIES))),
+        ("estilo", lambda at: at.select_slider[0].set_value(rng.choice(STYLES))),
+        ("vibe", lambda at: _widget(at.selectbox, "Vibe da Viagem").set_value(rng.choice(VIBES))),
+        ("calcular", lambda at: _widget(at.button, "💰 Calcular Investimento").click()),
+        ("concierge", lambda at: at.multiselect[0].set_value(rng.sample(CONCIERGE, 2))),
+        ("pessoas", lambda at: at.slider[0].set_value(rng.randint(1, 6))),
+    ]
+
+
+def journey_typo(rng):
+    """Digita errado, aceita a sugestão do autocompletar e calcula."""
+    return [
+        ("destino_typo", lambda at: at.text_input(key="dest_input").set_value(rng.choice(TYPOS))),
+        ("sugestao", _pick_suggestion),
+        ("datas", lambda at: at.date_input[0].set_value(_dates(rng))),
+        ("calcular", lambda at: _widget(at.button, "💰 Calcular Investimento").click()),
+    ]
+
+
+def journey_budget(rng):
+    """Tem um orçamento: ranking da base inteira a cada interação."""
+    return [
+        ("modo_orcamento", lambda at: at.radio[0].set_value("💸 Tenho um orçamento")),
+        ("datas", lambda at: at.date_input[0].set_value(_dates(rng))),
+        ("orcamento", lambda at: at.number_input[0].set_value(float(rng.choice([3000, 8000, 15000, 40000])))),
+        ("ordenar", lambda at: _widget(at.radio, "Ordenar por").set_value("Aproveitar o orçamento")),
+        ("estilo", lambda at: at.select_slider[0].set_value(rng.choice(STYLES))),
+    ]
+
+
+JOURNEYS = {"quote": journey_quote, "typo": journey_typo, "budget": journey_budget}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in JOURNEYS:
+            raise SystemExit(f"roteiro desconhecido: {name!r} (use {', '.join(JOURNEYS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# --- 2. SESSÕES ---
+class Session(threading.Thread):
+    """Um usuário: abre o app e repete roteiros sorteados do mix até o fim do teste."""
+
+    def __init__(self, sid, mix, think, stop, results, timeout):
+        super().__init__(name=f"loadtest-{sid}", daemon=True)
+        self.rng = random.Random(sid)
+        self.mix = mix
+        self.think = think
+        self.stop = stop
+        self.results = results  # etapa -> [segundos]; compartilhado (append é atômico)
+        self.timeout = timeout
+        self.reruns = self.journeys = 0
+        self.errors = []
+        self.ready = threading.Event()
+
+    def _run(self, at, step):
+        t0 = time.perf_counter()
+        at.run(timeout=self.timeout)
+        self.results[step].append(time.perf_counter() - t0)
+        self.reruns += 1
+        if at.exception:
+            self.errors.append(f"{step}: {at.exception[0].message}")
+
+    def _open(self):
+        from streamlit.testing.v1 import AppTest
+        at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        self._run(at, "abrir")
+        return at
+
+    def run(self):
+        names, weights = list(self.mix), list(self.mix.values())
+        try:
+            at = self._open()
+            first = True
+            while not self.stop.is_set():
+                journey = JOURNEYS[self.rng.choices(names, weights)[0]](self.rng)
+                for step, action in journey:
+                    if self.stop.is_set():
+                        break
+                    try:
+                        if action(at) is False:
+                            continue
+                    except (LookupError, IndexError) as exc:
+                        self.errors.append(f"{step}: {exc}")
+                        continue
+                    self._run(at, step)
+                    if self.think:
+                        time.sleep(self.rng.expovariate(1.0 / self.think))
+                else:
+                    self.journeys += 1
+                if first:
+                    first = False
+                    self.ready.set()  # sessão "cheia" (resultado + concierge em memória)
+                at = self._open()  # próximo roteiro começa de uma aba nova
+        except Exception as exc:
+            self.errors.append(f"sessão: {exc!r}")
+        finally:
+            self.ready.set()
+
+
+def _check_apptest(modules):
+    """Falha alto se o Streamlit instalado não tem os internos que isolate_apptest() troca."""
+    import streamlit
+    version = tuple(int(part) for part in streamlit.__version__.split(".")[:2] if part.isdigit())
+    if version < STREAMLIT_MIN:
+        raise RuntimeError(f"streamlit {streamlit.__version__} < {'.'.join(map(str, STREAMLIT_MIN))} "
+                           "(mínimo do loadtest)")
+    missing = [f"{name}.{attr}" for name, attrs in APPTEST_INTERNALS.items()
+               for attr in attrs if not hasattr(modules[name], attr)]
+    if not hasattr(modules["app_test"].Runtime, "_instance"):
+        missing.append("Runtime._instance")
+    if not hasattr(modules["app_test"].AppTest, "pills"):
+        missing.append("AppTest.pills")
+    if missing:
+        raise RuntimeError(f"streamlit {streamlit.__version__}: AppTest mudou, faltam {', '.join(missing)}; "
+                           "revise isolate_apptest()")
+    if version > STREAMLIT_TESTED:
+        logging.warning("loadtest: streamlit %s mais novo que o testado (%s); confira isolate_apptest() se algo falhar",
+                        streamlit.__version__, ".".join(map(str, STREAMLIT_TESTED)))
+
+
+def isolate_apptest():
+    """
+    O AppTest foi feito para um teste por vez: cada run() instala um Runtime falso global
+    (Runtime._instance) e o zera no fim, reaplica o patch de config e recompila o script. Com
+    sessões em paralelo, uma zerava o Runtime da outra no meio do script. Aqui o processo ganha
+    UM Runtime, UM cache de bytecode e UM registro de componentes (como o servidor real, compartilhados por todas as sessões)
+    e o AppTest escreve numa subclasse inerte. RuntimeError se o Streamlit não tem esses internos.
+    """
+    from unittest.mock import MagicMock, patch
+
+    from streamlit.testing.v1 import app_test, local_script_runner, util
+
+    _check_apptest({"app_test": app_test, "local_script_runner": local_script_runner, "util": util})
+
+    # Mesmas peças que o AppTest monta a cada run (importadas dele para acompanhar a versão do Streamlit)
+    Runtime = app_test.Runtime
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    if hasattr(app_test, "DataframeSourceManager"):  # 1.61+
+        runtime.dataframe_source_mgr = app_test.DataframeSourceManager()
+    Runtime._instance = runtime
+    app_test.Runtime = type("PerRunRuntime", (Runtime,), {})
+    # Bytecode do app.py compilado uma vez (o AppTest recompila a cada run; o servidor não, e
+    # compile() concorrente no 3.11 ainda esbarra em "AST constructor recursion depth mismatch")
+    script_cache = app_test.ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    # Idem para os componentes: a varredura dos pacotes instalados é ~0,6 s por AppTest novo
+    components = app_test.BidiComponentManager()
+    components.discover_and_register_components(start_file_watching=False)
+    components.discover_and_register_components = lambda **kwargs: None
+    runtime.bidi_component_registry = components
+    app_test.BidiComponentManager = lambda: components
+
+    # Patch de config aplicado uma vez para o processo todo (patch.object aninhado entre threads desfaz fora de ordem)
+    patch.object(util.config, "get_option", util.build_mock_config_get_option({"global.appTest": True})).start()
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+    # "missing ScriptRunContext": as threads do harness mexem no AppTest fora de um script
+    # (filtro, não nível: o Streamlit reajusta o nível dos próprios loggers ao carregar a config)
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage())
+
+
+def _pct(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(sessions, duration, mix, think, ramp, timeout):
+    results = defaultdict(list)
+    stop = threading.Event()
+
+    # Linha de base: módulos, fontes, índices e caches já carregados por uma sessão descartável
+    Session(-1, mix, 0, stop, defaultdict(list), timeout)._open()
+    gc.collect()
+    base_rss = rss_mib()
+
+    workers = [Session(i, mix, think, stop, results, timeout) for i in range(sessions)]
+    t0 = time.perf_counter()
+    for worker in workers:
+        worker.start()
+        if ramp:
+            time.sleep(ramp / sessions)
+    for worker in workers:
+        worker.ready.wait(timeout=duration)
+    gc.collect()
+    loaded_rss = rss_mib()
+
+    time.sleep(max(0.0, duration - (time.perf_counter() - t0)))
+    stop.set()
+    for worker in workers:
+        worker.join(timeout=timeout * 2)
+    elapsed = time.perf_counter() - t0
+
+    all_latencies = [s for values in results.values() for s in values]
+    return {
+        "sessions": sessions,
+        "duration_s": round(elapsed, 2),
+        "mix": mix,
+        "think_s": think,
+        "reruns": len(all_latencies),
+        "journeys": sum(w.journeys for w in workers),
+        "reruns_per_s": round(len(all_latencies) / elapsed, 2),
+        "journeys_per_s": round(sum(w.journeys for w in workers) / elapsed, 3),
+        "rss_base_mib": round(base_rss, 1),
+        "rss_loaded_mib": round(loaded_rss, 1),
+        "rss_per_session_mib": round((loaded_rss - base_rss) / sessions, 2),
+        "errors": [e for w in workers for e in w.errors][:50],
+        "steps": {
+            step: {
+                "count": len(values),
+                "p50_ms": round(_pct(values, 0.50) * 1000, 1),
+                "p95_ms": round(_pct(values, 0.95) * 1000, 1),
+                "p99_ms": round(_pct(values, 0.99) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1),
+                "mean_ms": round(statistics.fmean(values) * 1000, 1),
+            }
+            for step, values in sorted(results.items())
+        },
+        "total": {
+            "p50_ms": round(_pct(all_latencies, 0.50) * 1000, 1),
+            "p95_ms": round(_pct(all_latencies, 0.95) * 1000, 1),
+            "p99_ms": round(_pct(all_latencies, 0.99) * 1000, 1),
+        } if all_latencies else {},
+    }
+
+
+def report(summary):
+    print(f"{'etapa':<20}{'reruns':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, s in summary["steps"].items():
+        print(f"{step:<20}{s['count']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    total = summary["total"]
+    if total:
+        print(f"{'TODAS':<20}{summary['reruns']:>8}{total['p50_ms']:>10.1f}{total['p95_ms']:>10.1f}{total['p99_ms']:>10.1f}")
+    print(f"\n{summary['sessions']} sessões em {summary['duration_s']} s: {summary['reruns_per_s']} reruns/s, "
+          f"{summary['journeys_per_s']} roteiros/s")
+    print(f"Memória: {summary['rss_base_mib']} MiB de base -> {summary['rss_loaded_mib']} MiB com as sessões "
+          f"(~{summary['rss_per_session_mib']} MiB por sessão)")
+    if summary["errors"]:
+        print(f"⚠️ {len(summary['errors'])} erros, ex: {summary['errors'][0]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga do app.py (sessões simultâneas, offline)")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos de teste (inclui a rampa)")
+    parser.add_argument("--mix", default="quote=6,typo=2,budget=2", help="peso de cada roteiro")
+    parser.add_argument("--think", type=float, default=0.0, help="pausa média entre interações (s); 0 = sem pausa")
+    parser.add_argument("--ramp", type=float, default=2.0, help="segundos para abrir todas as sessões")
+    parser.add_argument("--timeout", type=float, default=30.0, help="tempo máximo de um rerun (s)")
+    parser.add_argument("--json", help="grava o resumo em JSON")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)  # o log por cotação distorce a medição
+    bench.install_stubs()
+    try:
+        isolate_apptest()
+    except RuntimeError as exc:
+        print(f"❌ {exc}", file=sys.stderr)
+        return 1
+    summary = run(args.sessions, args.duration, parse_mix(args.mix), args.think, args.ramp, args.timeout)
+    report(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2, ensure_ascii=False)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
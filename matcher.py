@@ -0,0 +1,95 @@
+# matcher.py
+# Casamento de destinos pré-compilado (Aho-Corasick).
+# Montado uma única vez no carregamento: o custo por cotação não depende mais
+# do tamanho de database.CITIES.
+
+import unicodedata
+from collections import deque
+
+
+def normalize(text):
+    """Remove acentos, baixa a caixa e apara espaços ('São Paulo ' -> 'sao paulo')."""
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn').lower().strip()
+
+
+class DestinationMatcher:
+    """
+    Replica a regra histórica do GeoCostProvider:
+      1. Igualdade exata com a chave normalizada.
+      2. Chave (len > 4) contida no texto digitado; vence a que aparece primeiro em CITIES.
+    """
+
+    # Chaves curtas ("pipa", "bali") só casam por igualdade, para evitar falsos positivos.
+    MIN_SUBSTRING_LEN = 4
+
+    def __init__(self, cities):
+        self.exact = {}
+        self._keys = []
+        self._data = []
+
+        # Autômato: goto[s] = {char: estado}, fail[s] = estado, out[s] = menor ordem que termina em s
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [None]
+
+        for order, (city_key, data) in enumerate(cities.items()):
+            key_norm = normalize(city_key)
+            self._keys.append(city_key)
+            self._data.append(data)
+            self.exact.setdefault(key_norm, order)
+            if len(city_key) > self.MIN_SUBSTRING_LEN:
+                self._add_pattern(key_norm, order)
+
+        self._build_failure_links()
+
+    def _add_pattern(self, pattern, order):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+            state = nxt
+        if self._out[state] is None or order < self._out[state]:
+            self._out[state] = order
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                # Herda a melhor saída do sufixo para não precisar percorrer a cadeia na busca
+                inherited = self._out[self._fail[nxt]]
+                if inherited is not None and (self._out[nxt] is None or inherited < self._out[nxt]):
+                    self._out[nxt] = inherited
+
+    def _scan(self, text):
+        best = None
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = out[state]
+            if hit is not None and (best is None or hit < best):
+                best = hit
+        return best
+
+    def match(self, dest_clean):
+        """Recebe o destino já normalizado. Retorna (city_key, data) ou None."""
+        order = self.exact.get(dest_clean)
+        if order is None:
+            order = self._scan(dest_clean)
+        if order is None:
+            return None
+        return self._keys[order], self._data[order]
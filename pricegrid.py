@@ -0,0 +1,162 @@
+# pricegrid.py
+# Tabela de preços pré-compilada (NumPy) para todas as cidades da base.
+#   life[cidade, estilo, vibe, coluna] -> gasto diário POR PESSOA em USD (colunas em LIFE_COLUMNS)
+#   adr[cidade, estilo]                -> diária de hotel POR QUARTO em USD (já com modifier de lodging)
+#   season[cidade, mês]                -> fator sazonal; a posição 12 é a viagem sem data (1.0)
+# Cotação de cidade conhecida vira leitura de array escalada por viajantes, quartos, noites e câmbio.
+# A tabela é refeita sozinha quando a base ou as tabelas do modelo mudam (impressão digital).
+
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+import config
+import telemetry
+
+# 'activities' já soma nightlife (é assim que o breakdown apresenta)
+LIFE_COLUMNS = ('food', 'transport', 'activities', 'misc', 'daily')
+NO_SEASON = 12
+
+
+def fingerprint(inputs):
+    """
+    Hash estável das entradas do modelo (base de cidades, multiplicadores, constantes da diária).
+    Entradas com atributo `version` (snapshot da base de destinos) entram só pela versão.
+    """
+    inputs = {name: getattr(value, 'version', None) or value for name, value in inputs.items()}
+    raw = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class PriceGrid:
+    """Snapshot imutável: quem pegou uma referência continua lendo a mesma tabela durante a cotação."""
+
+    def __init__(self, cities, anchor, styles, vibes, seasonality, adr_fn, fingerprint=None):
+        self.fingerprint = fingerprint
+        keys = list(cities)
+        self.rows = {key: i for i, key in enumerate(keys)}
+        self.styles = {key: i for i, key in enumerate(styles)}
+        self.vibes = {key: i for i, key in enumerate(vibes)}
+        self.profiles = [cities[key]['profile'] for key in keys]
+        self.names = keys
+        self.cities = cities
+        self.primary = np.array([not cities[key].get('alias_of') for key in keys], dtype=bool)
+        # Perfis climáticos distintos (poucos): a sazonalidade é calculada uma vez por perfil
+        self.profile_rows = {}
+        for i, profile in enumerate(self.profiles):
+            self.profile_rows.setdefault(profile, i)
+        profile_pos = {profile: n for n, profile in enumerate(self.profile_rows)}
+        self.profile_ids = np.array([profile_pos[p] for p in self.profiles], dtype=np.intp)
+
+        cats = list(anchor)
+        raw_idx = [cities[key]['idx'] for key in keys]
+        mods = [cities[key].get('modifiers', {}) for key in keys]
+
+        # Mesma ordem de multiplicação do cálculo escalar (engine._usd_core): resultado idêntico bit a bit
+        base = np.array([anchor[c] for c in cats])
+        city_f = np.array(raw_idx, dtype=np.float64) / 100.0
+        style_f = np.array([styles[s]['factor'] for s in styles])
+        vibe_m = np.array([[vibes[v][c] for c in cats] for v in vibes])
+        cat_m = np.array([[m.get(c, 1.0) for c in cats] for m in mods])
+        val = (base[None, None, None, :] * city_f[:, None, None, None]
+               * style_f[None, :, None, None] * vibe_m[None, None, :, :] * cat_m[:, None, None, :])
+        col = {c: val[..., k] for k, c in enumerate(cats)}
+        daily = np.zeros(val.shape[:3])
+        for k in range(len(cats)):
+            daily = daily + val[..., k]
+
+        self.life = np.stack(
+            [col['food'], col['transport'], col['activities'] + col['nightlife'], col['misc'], daily], axis=-1
+        )
+        self.adr = np.array([
+            [adr_fn(idx, styles[s]['hotel_pct']) * m.get('lodging', 1.0) for s in styles]
+            for idx, m in zip(raw_idx, mods)
+        ], dtype=np.float64).reshape(len(keys), len(styles))
+
+        padrao = seasonality['padrao']
+        self.season = np.ones((len(keys), NO_SEASON + 1))
+        for i, profile in enumerate(self.profiles):
+            self.season[i, :NO_SEASON] = seasonality.get(profile, padrao)
+
+        for arr in (self.life, self.adr, self.season, self.profile_ids, self.primary):
+            arr.setflags(write=False)
+
+    def row(self, city_key):
+        return self.rows.get(city_key)
+
+    @property
+    def nbytes(self):
+        return self.life.nbytes + self.adr.nbytes + self.season.nbytes
+
+    def memory_report(self):
+        return {
+            'cities': len(self.rows),
+            'shape': {'life': self.life.shape, 'adr': self.adr.shape, 'season': self.season.shape},
+            'bytes': {'life': self.life.nbytes, 'adr': self.adr.nbytes, 'season': self.season.nbytes},
+            'total_bytes': self.nbytes,
+        }
+
+
+class AutoPriceGrid:
+    """
+    Mantém a PriceGrid em dia com as entradas do modelo.
+    `inputs()` devolve o dict com cities/anchor/styles/vibes/seasonality e `adr_params()` as constantes
+    de `adr_fn`; a impressão digital cobre os dois. No máximo a cada config.PRICE_GRID_CHECK_SECONDS,
+    get() dispara a conferência numa thread de fundo (a requisição segue com a tabela atual); se mudou,
+    a tabela é refeita e `on_rebuild(grid)` é chamado (ex: limpar o memo de orçamentos).
+    """
+
+    def __init__(self, inputs, adr_fn, on_rebuild=None, check_seconds=None, adr_params=None):
+        self.inputs = inputs
+        self.adr_fn = adr_fn
+        self.adr_params = adr_params or dict
+        self.on_rebuild = on_rebuild
+        self.check_seconds = config.PRICE_GRID_CHECK_SECONDS if check_seconds is None else check_seconds
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        inputs = self.inputs()
+        self._grid = self._build(inputs, self._fingerprint(inputs))
+
+    def _fingerprint(self, inputs):
+        return fingerprint(dict(inputs, adr=self.adr_params()))
+
+    def _build(self, inputs, fp):
+        t0 = time.perf_counter()
+        grid = PriceGrid(adr_fn=self.adr_fn, fingerprint=fp, **inputs)
+        telemetry.count('takeitiz_price_grid_builds_total')
+        logging.debug("Tabela de preços: %d cidades, %.1f KiB, montada em %.1f ms",
+                      len(grid.rows), grid.nbytes / 1024, (time.perf_counter() - t0) * 1000)
+        return grid
+
+    def get(self):
+        if time.monotonic() - self._checked_at >= self.check_seconds:
+            self._checked_at = time.monotonic()  # uma thread por intervalo, não uma por requisição
+            threading.Thread(target=self._background_refresh, daemon=True, name="pricegrid-refresh").start()
+        return self._grid
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as exc:
+            telemetry.suppressed('pricegrid.refresh', exc)
+
+    def refresh(self, force=False):
+        """Confere a impressão digital agora; refaz a tabela se mudou (ou se force=True)."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            inputs = self.inputs()  # uma leitura só: a tabela e a impressão digital vêm do mesmo snapshot
+            fp = self._fingerprint(inputs)
+            if not force and fp == self._grid.fingerprint:
+                return self._grid
+            grid = self._build(inputs, fp)
+            self._grid = grid
+        if self.on_rebuild:
+            self.on_rebuild(grid)
+        return grid
+
+    def memory_report(self):
+        return self._grid.memory_report()
@@ -0,0 +1,194 @@
+# profiler.py
+# Perfil por amostragem (opt-in) das cotações e tickets lentos, para descobrir para onde foi o tempo
+# (yfinance, Nominatim, cache SQLite, Pillow...) sem reproduzir o caso na mão.
+# - Liga no processo todo com TAKEITIZ_PROFILE=1, ou numa sessão com ?profile=<TAKEITIZ_PROFILE_TOKEN>.
+# - Enquanto houver captura ativa, uma thread amostra a pilha da requisição (e das threads dos pools
+#   de provedores/hedge, onde câmbio e geo rodam) a cada config.PROFILE_INTERVAL_MS.
+# - Requisição acima de config.PROFILE_THRESHOLD_MS: grava as pilhas no formato "collapsed"
+#   (uma linha "raiz;...;folha contagem"), lido por flamegraph.pl, speedscope e inferno.
+# - Rotação: no máximo PROFILE_MAX_FILES arquivos / PROFILE_MAX_BYTES no diretório; os mais antigos saem.
+# Desligado, profiled() devolve um nullcontext compartilhado: custo de um if por requisição.
+
+import contextlib
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import config
+import telemetry
+
+# Threads que trabalham para a requisição (câmbio e geo rodam no pool de provedores, o hedge no dele).
+# Atenção: os pools são do processo; com sessões simultâneas, o perfil pode incluir trabalho de outra cotação.
+WORKER_PREFIXES = ("takeitiz-provider", "takeitiz-hedge")
+# Frames de infraestrutura do pool: uma thread só com eles está ociosa (esperando tarefa)
+_IDLE_FILES = ("threading.py", "thread.py", "queue.py")
+
+_NULL = contextlib.nullcontext()
+
+
+def admin_requested(token):
+    """True se o parâmetro ?profile= bate com o token de admin (comparação em tempo constante)."""
+    return bool(token and config.PROFILE_ADMIN_TOKEN
+                and hmac.compare_digest(str(token), config.PROFILE_ADMIN_TOKEN))
+
+
+def profiled(name, force=False):
+    """
+    Context manager que perfila o bloco se o perfil estiver ligado (processo ou `force`).
+        with profiler.profiled("quote", force=admin):
+            res = engine.engine.calculate_cost(...)
+    """
+    if not (force or config.PROFILE_ENABLED):
+        return _NULL
+    if getattr(_local, "active", False):
+        return _NULL  # já dentro de uma captura nesta thread (ex: ticket chamado de dentro da cotação)
+    return _Capture(name)
+
+
+_local = threading.local()
+
+
+class _Capture:
+    def __init__(self, name):
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._root = None
+
+    def __enter__(self):
+        _local.active = True
+        self._root = sys._getframe(1)  # corta tudo acima do `with` (runner do Streamlit etc.)
+        self.t0 = time.perf_counter()
+        _SAMPLER.add(self)
+        return self
+
+    def __exit__(self, *exc):
+        elapsed_ms = (time.perf_counter() - self.t0) * 1000
+        _SAMPLER.remove(self)
+        _local.active = False
+        if elapsed_ms >= config.PROFILE_THRESHOLD_MS:
+            try:
+                path = save(self.name, elapsed_ms, self.stacks)
+            except OSError as exc:
+                telemetry.suppressed('profiler.save', exc)
+            else:
+                logging.info("Perfil: %s levou %.0f ms (%d amostras) -> %s", self.name, elapsed_ms, self.samples, path)
+                telemetry.count('takeitiz_profiles_total', call=self.name, result='saved')
+        else:
+            telemetry.count('takeitiz_profiles_total', call=self.name, result='fast')
+        return False
+
+    def sample(self, frames, names):
+        """Uma amostra: pilha da requisição + pilhas dos workers que estão trabalhando."""
+        frame = frames.get(self.thread_id)
+        if frame is None:
+            return
+        self.samples += 1
+        stack = _walk(frame, stop=self._root)
+        self.stacks[";".join([self.name] + stack)] += 1
+        for ident, thread_name in names.items():
+            if ident == self.thread_id or not thread_name.startswith(WORKER_PREFIXES):
+                continue
+            worker = frames.get(ident)
+            stack = _walk(worker) if worker is not None else []
+            # Descarta o bootstrap do pool; o que sobra é a tarefa (vazio = worker ocioso)
+            while stack and stack[0].split(":", 1)[0] in _IDLE_FILES:
+                stack.pop(0)
+            if stack:
+                self.stacks[";".join([self.name, thread_name.rsplit("_", 1)[0]] + stack)] += 1
+
+
+def _walk(frame, stop=None):
+    """Pilha raiz -> folha como 'arquivo:função' (sem número de linha: agrupa melhor no flame graph)."""
+    out = []
+    while frame is not None and frame is not stop:
+        code = frame.f_code
+        out.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    out.reverse()
+    return out
+
+
+class _Sampler:
+    """Uma thread por processo, viva só enquanto houver captura ativa."""
+
+    def __init__(self):
+        self._captures = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, capture):
+        with self._lock:
+            self._captures.add(capture)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="takeitiz-profiler")
+                self._thread.start()
+
+    def remove(self, capture):
+        with self._lock:
+            self._captures.discard(capture)
+
+    def _loop(self):
+        interval = config.PROFILE_INTERVAL_MS / 1000
+        while True:
+            time.sleep(interval)
+            names = {t.ident: t.name for t in threading.enumerate()}
+            # Amostra sob o lock: remove() só volta depois da última amostra (o __exit__ grava a pilha estável)
+            with self._lock:
+                if not self._captures:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for capture in self._captures:
+                    capture.sample(frames, names)
+                del frames
+
+
+_SAMPLER = _Sampler()
+
+
+# --- GRAVAÇÃO + ROTAÇÃO ---
+def save(name, elapsed_ms, stacks, directory=None):
+    """Grava {pilha: amostras} (escrita atômica) e aplica os limites de rotação. Devolve o caminho."""
+    directory = directory or config.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(directory, f"{stamp}-{name}-{elapsed_ms:.0f}ms-{os.getpid()}-{threading.get_ident() % 10000}.folded")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+            fh.write(f"{stack} {count}\n")
+    os.replace(tmp, path)
+    rotate(directory)
+    return path
+
+
+def rotate(directory, max_files=None, max_bytes=None):
+    """Apaga os perfis mais antigos até caber em max_files arquivos e max_bytes no total."""
+    max_files = config.PROFILE_MAX_FILES if max_files is None else max_files
+    max_bytes = config.PROFILE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(".folded"):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue  # outra réplica/worker já apagou
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    entries.sort(reverse=True)  # mais novo primeiro
+
+    kept = total = 0
+    for _, size, path in entries:
+        if kept < max_files and total + size <= max_bytes:
+            kept += 1
+            total += size
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,404 @@
+# quotebatch.py
+# Recotação em lote de viagens (CSV ou JSONL) pelo CostEngine, num pool de processos.
+# Serve para reprecificar o histórico depois de uma calibração em destinations.csv/database.py.
+#
+# Uso:
+#   python quotebatch.py viagens.csv -o cotacoes.csv
+#   python quotebatch.py viagens.jsonl -o cotacoes.jsonl --workers 8
+#   python quotebatch.py viagens.csv -o cotacoes.csv --resume      # continua de onde parou
+#
+# Colunas de entrada: destination (obrigatória), start_date e end_date (ISO) ou days, travelers,
+# style, vibe, currency, seasonality. Qualquer outra coluna (ex: id) é copiada para a saída.
+#
+# - Câmbio: buscado uma vez por execução (uma coleta para a cesta inteira) e gravado em <saída>.fx.json;
+#   os workers cotam em USD e o processo principal converte. Ao retomar, a mesma tabela é reaproveitada.
+# - Geocodificação: uma passada prévia resolve cada destino fora da base uma única vez (1 req/s)
+#   e grava no cache L2 (SQLite/Redis), que todos os workers leem. Os workers nunca chamam o
+#   Nominatim (o limitador é por processo): destino que a passada não resolveu sai com 'geo' em defaulted.
+# - Saída em streaming, na ordem da entrada, com a coluna 'row'. Ela mesma é o ponto de
+#   retomada: --resume descarta a última linha incompleta e continua da linha seguinte.
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import config
+
+CURRENCIES = ("USD",) + config.FX_CURRENCIES
+BREAKDOWN = ("lodging", "food", "transport", "activities", "misc")
+RESULT_COLUMNS = ["total", "daily_avg"] + [f"breakdown_{cat}" for cat in BREAKDOWN] + [
+    "fx_rate", "fx_source", "defaulted", "error"]
+DEFAULTS = {"travelers": 1, "style": "moderado", "vibe": "tourist_mix", "currency": "BRL", "seasonality": "nightly"}
+
+PROGRESS_SECONDS = 1.0
+
+
+# --- 1. ENTRADA ---
+class InvalidRecord(dict):
+    """Linha JSONL ilegível (JSON quebrado ou que não é objeto): vira linha de erro na saída."""
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+
+def read_trips(path, fmt):
+    """(índice, registro) de cada viagem, em streaming. O índice é a coluna 'row' da saída."""
+    with open(path, encoding="utf-8", newline="") as fh:
+        if fmt == "csv":
+            for i, rec in enumerate(csv.DictReader(fh)):
+                yield i, rec
+            return
+        i = 0
+        for line in fh:
+            if line.strip():
+                try:
+                    rec = json.loads(line)
+                except ValueError as exc:
+                    rec = InvalidRecord(f"JSON inválido: {exc}")
+                if not isinstance(rec, dict):
+                    rec = InvalidRecord(f"registro não é um objeto JSON ({type(rec).__name__})")
+                yield i, rec
+                i += 1
+
+
+def input_columns(path, fmt):
+    """Colunas de entrada copiadas para a saída CSV (cabeçalho do CSV ou chaves do 1º registro válido)."""
+    for _, rec in read_trips(path, fmt):
+        if not isinstance(rec, InvalidRecord):
+            return list(rec)
+    return []
+
+
+def _field(rec, name):
+    value = rec.get(name)
+    if value is None or str(value).strip() == "":
+        return DEFAULTS.get(name)
+    return str(value).strip()
+
+
+def parse_trip(rec):
+    """Argumentos de calculate_cost (sem a moeda) a partir de um registro. ValueError se inválido."""
+    if isinstance(rec, InvalidRecord):
+        raise ValueError(rec.error)
+    destination = _field(rec, "destination")
+    if not destination:
+        raise ValueError("destination vazio")
+    start = _field(rec, "start_date")
+    start_date = date.fromisoformat(start) if start else None
+    end = _field(rec, "end_date")
+    if end:
+        if start_date is None:
+            raise ValueError("end_date sem start_date")
+        days = (date.fromisoformat(end) - start_date).days + 1  # mesma conta do app
+    elif _field(rec, "days"):
+        days = int(_field(rec, "days"))
+    else:
+        raise ValueError("informe days ou start_date/end_date")
+    travelers = int(_field(rec, "travelers"))
+    if days < 1 or travelers < 1:
+        raise ValueError("days e travelers devem ser >= 1")
+    return destination, days, travelers, _field(rec, "style").lower(), _field(rec, "vibe"), start_date, _field(rec, "seasonality")
+
+
+def trip_currency(rec):
+    currency = _field(rec, "currency").upper()
+    if currency not in CURRENCIES:
+        raise ValueError(f"moeda {currency!r} não suportada")
+    return currency
+
+
+# --- 2. WORKERS ---
+_ENGINE = None
+
+
+def _engine():
+    # Um CostEngine por processo (grade de preços, índices e caches próprios; L2 compartilhado)
+    global _ENGINE
+    if _ENGINE is None:
+        import engine
+        _ENGINE = engine.engine
+    return _ENGINE
+
+
+def _init_worker():
+    # Geocache só leitura: N processos com limitador próprio furariam a política de 1 req/s
+    _engine().geo.geocache.offline = True
+
+
+def quote_chunk(task):
+    """Cota um bloco de viagens em USD. Devolve [(índice, registro, resultado em USD ou None, erro)]."""
+    chunk, deadline = task
+    eng = _engine()
+    out = []
+    for i, rec in chunk:
+        try:
+            trip_currency(rec)
+            destination, days, travelers, style, vibe, start_date, seasonality = parse_trip(rec)
+            res = eng.calculate_cost(destination, days, travelers, style, "USD", vibe, start_date,
+                                     seasonality=seasonality, deadline=deadline)
+            usd = {"total": res["total"], "daily_avg": res["daily_avg"], "defaulted": res["defaulted"],
+                   "breakdown": {cat: res["breakdown"][cat] for cat in BREAKDOWN}}
+            out.append((i, rec, usd, None))
+        except (ValueError, TypeError) as exc:
+            out.append((i, rec, None, str(exc)))  # entrada inválida
+        except Exception as exc:
+            # Qualquer outra falha (cache, base...) vira erro na linha, sem derrubar o lote
+            out.append((i, rec, None, f"{type(exc).__name__}: {exc}"))
+    return out
+
+
+def _chunks(trips, size, deadline):
+    chunk = []
+    for item in trips:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk, deadline
+            chunk = []
+    if chunk:
+        yield chunk, deadline
+
+
+# --- 3. CÂMBIO E GEOCODIFICAÇÃO (UMA VEZ POR EXECUÇÃO) ---
+def scan(path, fmt, start_row):
+    """Passada leve pela entrada: total de linhas a cotar, moedas e destinos distintos."""
+    import matcher
+    total, currencies, destinations = 0, set(), {}
+    for i, rec in read_trips(path, fmt):
+        if i < start_row:
+            continue
+        total += 1
+        if isinstance(rec, InvalidRecord):
+            continue
+        try:
+            currencies.add(trip_currency(rec))
+        except ValueError:
+            pass
+        dest = _field(rec, "destination")
+        if dest:
+            destinations.setdefault(matcher.normalize(dest), dest)
+    return total, currencies, list(destinations.values())
+
+
+def fx_table(currencies, path, timeout):
+    """{moeda: [taxa, fonte, coletada_em]} gravada ao lado da saída; ao retomar, só busca as que faltam."""
+    rates = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            rates = json.load(fh)
+    missing = [c for c in sorted(currencies) if c not in rates]
+    if missing:
+        fx = _engine().fx
+        for currency in missing:
+            if currency != "USD":  # moeda base: taxa fixa, fora da cesta (prefetch só esperaria à toa)
+                fx.store.prefetch(currency, timeout)
+            rates[currency] = list(fx.get_quote(currency))
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(rates, fh, indent=2)
+        os.replace(tmp, path)
+    return rates
+
+
+def warm_geocode(destinations):
+    """Resolve cada destino distinto uma vez (base e gazetteer na hora, o resto no Nominatim a 1 req/s)."""
+    geo = _engine().geo
+    t0 = last = time.perf_counter()
+    for n, dest in enumerate(destinations, 1):
+        geo.get_data(dest)
+        now = time.perf_counter()
+        if now - last >= PROGRESS_SECONDS:
+            last = now
+            print(f"   geocodificação prévia: {n}/{len(destinations)} ({now - t0:.0f} s)", file=sys.stderr)
+
+
+# --- 4. SAÍDA (ORDENADA E RETOMÁVEL) ---
+def resume_point(path, fmt):
+    """Próxima linha a cotar segundo a saída existente. Corta a última gravação se ficou incompleta."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as fh:
+        data = fh.read()
+        cut, row = _last_record(data, fmt)
+        if cut < len(data):
+            fh.truncate(cut)  # interrompido no meio de uma gravação
+    return 0 if row is None else int(row) + 1
+
+
+def _last_record(data, fmt):
+    """(fim da última gravação completa, coluna 'row' dela ou None se não há nenhuma)."""
+    if fmt == "jsonl":
+        cut = data.rfind(b"\n") + 1
+        lines = data[:cut].splitlines()
+        return cut, (json.loads(lines[-1])["row"] if lines else None)
+
+    # CSV: colunas copiadas da entrada podem ter quebra de linha entre aspas, então só o
+    # csv.reader sabe onde cada gravação termina. Ele consome uma linha física por vez:
+    # `pos` marca o fim da última linha entregue a ele.
+    pos = 0
+
+    def physical_lines():
+        nonlocal pos
+        for line in data.splitlines(keepends=True):
+            pos += len(line)
+            yield line.decode("utf-8")
+
+    cut, row, width = 0, None, None
+    try:
+        for rec in csv.reader(physical_lines(), strict=True):
+            if data[pos - 1:pos] not in (b"\n", b"\r"):
+                break  # última linha sem terminador: gravação pela metade
+            if width is None:
+                width = len(rec)  # cabeçalho
+            elif len(rec) != width:
+                break
+            else:
+                row = rec[0]
+            cut = pos
+    except (csv.Error, UnicodeDecodeError):
+        pass  # aspas abertas ou UTF-8 cortado no fim do arquivo: a gravação não terminou
+    return cut, row
+
+
+def format_result(i, rec, usd, error, rates):
+    out = {"row": i}
+    out.update((k, v) for k, v in rec.items() if k != "row")
+    if usd is not None:
+        currency = trip_currency(rec)
+        rate, source = rates[currency][0], rates[currency][1]
+        out.update(total=round(usd["total"] * rate, 2), daily_avg=round(usd["daily_avg"] * rate, 2))
+        for cat in BREAKDOWN:
+            out[f"breakdown_{cat}"] = round(usd["breakdown"][cat] * rate, 2)
+        out.update(fx_rate=rate, fx_source=source, defaulted="|".join(usd["defaulted"]), error="")
+    else:
+        out["error"] = error
+    return out
+
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.rows = self.errors = self.defaulted = 0
+        self.t0 = self._last = time.perf_counter()
+
+    def update(self, results):
+        for _, _, usd, _ in results:
+            self.rows += 1
+            if usd is None:
+                self.errors += 1
+            elif usd["defaulted"]:
+                self.defaulted += 1
+        now = time.perf_counter()
+        if now - self._last >= PROGRESS_SECONDS:
+            self._last = now
+            print(f"   {self.line()}", file=sys.stderr)
+
+    def line(self):
+        elapsed = time.perf_counter() - self.t0
+        rate = self.rows / elapsed if elapsed else 0.0
+        eta = (self.total - self.rows) / rate if rate else 0.0
+        pct = 100.0 * self.rows / self.total if self.total else 100.0
+        return (f"{self.rows}/{self.total} ({pct:.1f}%) em {elapsed:.1f} s, {rate:.0f} viagens/s, "
+                f"ETA {eta:.0f} s, {self.errors} com erro, {self.defaulted} com valor padrão")
+
+
+def run(trips, out, columns, fmt, rates, progress, workers, window, chunk_size, deadline):
+    """Cota e grava na ordem da entrada; com workers=0 roda no próprio processo."""
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore", lineterminator="\n") if fmt == "csv" else None
+
+    def emit(results):
+        for result in results:
+            row = format_result(*result, rates)
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row, ensure_ascii=False, default=str))
+                out.write("\n")
+        out.flush()  # cada bloco gravado é um ponto de retomada
+        progress.update(results)
+
+    tasks = _chunks(trips, chunk_size, deadline)
+    if workers == 0:
+        for task in tasks:
+            emit(quote_chunk(task))
+        return
+
+    # spawn: cada worker importa o engine do zero (sem herdar threads, conexões SQLite e locks do pai)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker) as pool:
+        pending = deque()
+        try:
+            for task in tasks:
+                pending.append(pool.submit(quote_chunk, task))
+                if len(pending) >= window:
+                    emit(pending.popleft().result())
+            while pending:
+                emit(pending.popleft().result())
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def _format(path, fmt=None):
+    return fmt or ("csv" if path.endswith(".csv") else "jsonl")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recota em lote um arquivo de viagens")
+    parser.add_argument("input", help="arquivo de viagens (.csv ou .jsonl)")
+    parser.add_argument("-o", "--out", required=True, help="arquivo de saída (.csv ou .jsonl)")
+    parser.add_argument("--input-format", choices=("jsonl", "csv"), default=None, help="padrão: pela extensão")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None, help="padrão: pela extensão")
+    parser.add_argument("--resume", action="store_true", help="continua uma execução interrompida")
+    parser.add_argument("--workers", type=int, default=None, help="processos (0 = sem pool; padrão: núcleos)")
+    parser.add_argument("--chunk", type=int, default=256, help="viagens por tarefa")
+    parser.add_argument("--window", type=int, default=None, help="tarefas em voo (limita a memória)")
+    parser.add_argument("--deadline", type=float, default=30.0,
+                        help="prazo por cotação (s); em lote vale esperar em vez de cair no valor padrão")
+    parser.add_argument("--fx-timeout", type=float, default=15.0, help="espera pela cotação de cada moeda (s)")
+    args = parser.parse_args(argv)
+
+    in_fmt = _format(args.input, args.input_format)
+    fmt = _format(args.out, args.format)
+    workers = (os.cpu_count() or 1) if args.workers is None else args.workers
+    window = args.window or max(2, 2 * workers)
+
+    start_row = resume_point(args.out, fmt) if args.resume else 0
+    if not args.resume and os.path.exists(args.out):
+        print(f"❌ {args.out} já existe (use --resume para continuar ou apague o arquivo)", file=sys.stderr)
+        return 1
+
+    t0 = time.perf_counter()
+    total, currencies, destinations = scan(args.input, in_fmt, start_row)
+    rates = fx_table(currencies, f"{args.out}.fx.json", args.fx_timeout)
+    for currency, (rate, source, _) in sorted(rates.items()):
+        print(f"   câmbio {currency}: {rate:.4f} ({source})", file=sys.stderr)
+    warm_geocode(destinations)
+    print(f"   {total} viagens a cotar (a partir da linha {start_row}), {len(destinations)} destinos distintos, "
+          f"preparação em {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+
+    columns = ["row"] + [c for c in input_columns(args.input, in_fmt) if c not in RESULT_COLUMNS and c != "row"] + RESULT_COLUMNS
+    trips = ((i, rec) for i, rec in read_trips(args.input, in_fmt) if i >= start_row)
+    progress = Progress(total)
+    with open(args.out, "a", encoding="utf-8", newline="") as out:
+        if fmt == "csv" and out.tell() == 0:
+            csv.writer(out, lineterminator="\n").writerow(columns)
+        try:
+            run(trips, out, columns, fmt, rates, progress, workers, window, args.chunk, args.deadline)
+        except KeyboardInterrupt:
+            print(f"\n⏸️  interrompido: {progress.line()}. Continue com --resume.", file=sys.stderr)
+            return 130
+    print(f"✅ {progress.line()} -> {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# resilience.py
+# Circuit breakers por upstream (yfinance, awesomeapi, Nominatim) e requisições com hedge.
+# - Fechado: as chamadas passam; `failure_threshold` falhas seguidas abrem o circuito.
+# - Aberto: o upstream é pulado na hora (sem esperar timeout) durante `reset_seconds`.
+# - Meio-aberto: vencido o intervalo, UMA chamada de teste passa; sucesso fecha, falha reabre.
+# Políticas em config.BREAKER_* (padrão) e config.BREAKER_POLICIES (por upstream).
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+import telemetry
+
+
+class CircuitOpenError(RuntimeError):
+    """Upstream com o circuito aberto: a chamada nem foi feita."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_threshold=None, reset_seconds=None, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = config.BREAKER_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.reset_seconds = config.BREAKER_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None  # meio-aberto: teste em andamento
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        # Chamado com o lock
+        if state != self.state:
+            self.state = state
+            telemetry.count('takeitiz_circuit_transitions_total', upstream=self.name, state=state)
+
+    def _probe_due(self, now):
+        if self.state == self.OPEN:
+            return now - self._opened_at >= self.reset_seconds
+        # Teste travado (thread que nunca voltou) não prende o circuito para sempre
+        return self._probe_started is None or now - self._probe_started >= self.reset_seconds
+
+    def ready(self):
+        """Sem efeito colateral: False se a chamada seria rejeitada agora (checagem antes de filas/limitadores)."""
+        with self._lock:
+            return self.state == self.CLOSED or self._probe_due(self.clock())
+
+    def allow(self):
+        """Reserva a passagem de uma chamada. No meio-aberto, só uma por vez (o teste)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = self.clock()
+            if not self._probe_due(now):
+                telemetry.count('takeitiz_circuit_rejected_total', upstream=self.name)
+                return False
+            self._transition(self.HALF_OPEN)
+            self._probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_started = None
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_started = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+                self._transition(self.OPEN)
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args) sob o circuito. CircuitOpenError se aberto; exceções de fn contam como falha."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name}: circuito aberto")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker(name):
+    """Breaker único por upstream no processo (todas as sessões enxergam o mesmo estado)."""
+    with _BREAKERS_LOCK:
+        found = _BREAKERS.get(name)
+        if found is None:
+            found = _BREAKERS[name] = CircuitBreaker(name, **config.BREAKER_POLICIES.get(name, {}))
+        return found
+
+
+# --- HEDGE ---
+# Pool pequeno e próprio: o perdedor de um hedge termina em background sem ocupar o pool de provedores
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="takeitiz-hedge")
+
+
+def hedged(primary, backup, delay, call="hedge"):
+    """
+    Roda primary(); se não responder em `delay` s (ou falhar antes), dispara backup() em paralelo.
+    Devolve (0 ou 1, resultado) da primeira que der certo; se as duas falharem, levanta o último erro.
+    """
+    futures = [_HEDGE_POOL.submit(primary)]
+    done, _ = wait(futures, timeout=delay)
+    if not done or futures[0].exception() is not None:
+        futures.append(_HEDGE_POOL.submit(backup))
+
+    pending, error = set(futures), None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                winner = futures.index(future)
+                outcome = 'backup' if winner else ('primary_hedged' if len(futures) > 1 else 'primary')
+                telemetry.count('takeitiz_hedged_total', call=call, outcome=outcome)
+                return winner, future.result()
+            error = future.exception()
+    telemetry.count('takeitiz_hedged_total', call=call, outcome='failed')
+    raise error
@@ -1,8 +1,44 @@
 import io
 import textwrap
+import threading
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 
+W, H = 600, 900
+MARGIN = 30
+CARD_TOP = 120
+FOOTER_H = 90
+
+# Formatos de saída: PNG RGB (padrão do app), PNG com paleta, WebP com e sem perda.
+# Para o ticket (poucas cores chapadas + texto) a paleta de 64 cores fica ~1/4 do PNG RGB.
+FORMATS = {
+    'png':           {'ext': 'png',  'mime': 'image/png'},
+    'png8':          {'ext': 'png',  'mime': 'image/png'},
+    'webp':          {'ext': 'webp', 'mime': 'image/webp'},
+    'webp-lossless': {'ext': 'webp', 'mime': 'image/webp'},
+}
+PALETTE_COLORS = 64
+WEBP_QUALITY = 80
+
+@lru_cache(maxsize=None)
+def _load_font(path, size):
+    # Cache do processo: cada (arquivo, tamanho) é lido do disco uma única vez
+    try:
+        # Carregamento direto do disco (Instantâneo)
+        return ImageFont.truetype(path, size)
+    except OSError:
+        # Fallback de segurança caso o arquivo não seja encontrado
+        return ImageFont.load_default()
+
 class TicketGenerator:
+    # Camadas estáticas renderizadas uma vez por processo: fundo (card, logo) e a faixa do rodapé,
+    # colada por último (como no desenho original) para cobrir destino longo que invade a faixa
+    _background = None
+    _footer = None
+    _background_lock = threading.Lock()
+    # Paletas (por nº de cores) calculadas uma vez por processo a partir de um ticket de referência
+    _palettes = {}
+
     def __init__(self):
         # SPRINT 1: OTIMIZAÇÃO DE ASSETS
         # Fontes lidas localmente para eliminar latência de rede.
@@ -18,65 +54,128 @@ class TicketGenerator:
         self.font_logo = self.get_font(self.FONT_BOLD, 28)
 
     def get_font(self, path, size):
-        try:
-            # Carregamento direto do disco (Instantâneo)
-            return ImageFont.truetype(path, size)
-        except OSError:
-            # Fallback de segurança caso o arquivo não seja encontrado
-            return ImageFont.load_default()
+        return _load_font(path, size)
 
     def format_money(self, val, curr):
         s = f"{val:,.2f}".replace(',','X').replace('.',',').replace('X','.')
-        sym = {"BRL": "R$", "USD": "$", "EUR": "€"}.get(curr, "$")
+        sym = {"BRL": "R$", "USD": "$", "EUR": "€", "GBP": "£", "ARS": "AR$", "CLP": "CLP$", "MXN": "MX$"}.get(curr, "$")
         return f"{sym} {s}"
 
-    def create_ticket(self, destination, total, daily, days, vibe, currency):
-        W, H = 600, 900
+    def _render_background(self):
         # Fundo Azul Marca Takeitiz
         img = Image.new('RGB', (W, H), color='#1E88E5')
         draw = ImageDraw.Draw(img)
 
         # CARD BRANCO CENTRAL
-        margin = 30
-        top = 120
         bottom = H - 120
-        draw.rectangle([(margin, top), (W-margin, bottom)], fill='#FFFFFF', outline=None)
-        
+        draw.rectangle([(MARGIN, CARD_TOP), (W-MARGIN, bottom)], fill='#FFFFFF', outline=None)
+
         # 1. HEADER (Logo no topo azul)
         draw.text((W/2, 60), "Takeitiz 🧳", font=self.font_logo, fill='#FFFFFF', anchor="mm")
+        return img
+
+    def _render_footer(self):
+        # 3. RODAPÉ DE GROWTH (Preto com URL amarela/branca), só a faixa de baixo
+        img = Image.new('RGB', (W, FOOTER_H), color='#212121')
+        draw = ImageDraw.Draw(img)
+        draw.text((W/2, FOOTER_H/2), "Baixe agora: takeitiz.com.br", font=self.font_url, fill='#FFFFFF', anchor="mm")
+        return img
+
+    def background(self):
+        cls = TicketGenerator
+        if cls._background is None:
+            with cls._background_lock:
+                if cls._background is None:
+                    cls._background = self._render_background()
+        return cls._background
+
+    def footer(self):
+        cls = TicketGenerator
+        if cls._footer is None:
+            with cls._background_lock:
+                if cls._footer is None:
+                    cls._footer = self._render_footer()
+        return cls._footer
+
+    def palette(self, colors=PALETTE_COLORS):
+        """
+        Paleta fixa para o PNG com paleta. Median cut preserva as cores chapadas da marca
+        (o octree funde o card branco com o quadro do total); quantizar contra uma paleta
+        pronta custa ~3x menos que calcular uma por imagem.
+        """
+        cls = TicketGenerator
+        pal = cls._palettes.get(colors)
+        if pal is None:
+            ref = self.render_image("Fernando de Noronha", 12345.67, 456.78, 7, "gastro", "BRL")
+            with cls._background_lock:
+                pal = cls._palettes.get(colors)
+                if pal is None:
+                    pal = cls._palettes[colors] = ref.quantize(colors=colors, method=Image.Quantize.MEDIANCUT,
+                                                               dither=Image.Dither.NONE)
+        return pal
+
+    def encode(self, img, fmt='png', quality=None, compress_level=None, colors=None):
+        """Bytes da imagem no formato de FORMATS ('png' sem parâmetros = o mesmo PNG do app)."""
+        buf = io.BytesIO()
+        if fmt == 'png':
+            params = {} if compress_level is None else {'compress_level': compress_level}
+            img.save(buf, format='PNG', **params)
+        elif fmt == 'png8':
+            pal = self.palette(colors or PALETTE_COLORS)
+            img.quantize(palette=pal, dither=Image.Dither.NONE).save(
+                buf, format='PNG', compress_level=9 if compress_level is None else compress_level)
+        elif fmt == 'webp':
+            img.save(buf, format='WEBP', quality=quality or WEBP_QUALITY, method=4)
+        elif fmt == 'webp-lossless':
+            img.save(buf, format='WEBP', lossless=True, quality=quality or WEBP_QUALITY, method=4)
+        else:
+            raise ValueError(f"formato {fmt!r} desconhecido (use {', '.join(FORMATS)})")
+        return buf.getvalue()
+
+    def render_png(self, destination, total, daily, days, vibe, currency):
+        """Desenha só o texto dinâmico sobre a camada estática e devolve os bytes PNG."""
+        return self.encode(self.render_image(destination, total, daily, days, vibe, currency))
+
+    def render_image(self, destination, total, daily, days, vibe, currency):
+        """Ticket como imagem PIL (RGB), antes da codificação."""
+        img = self.background().copy()
+        draw = ImageDraw.Draw(img)
 
         # 2. CONTEÚDO NO CARD
-        cursor = top + 80
-        
+        cursor = CARD_TOP + 80
+
         # Destino
         dest_lines = textwrap.wrap(destination.upper(), width=14)
         for line in dest_lines:
             draw.text((W/2, cursor), line, font=self.font_dest, fill='#333333', anchor="mm")
             cursor += 50
-            
+
         cursor += 40
         draw.line([(150, cursor), (450, cursor)], fill='#EEEEEE', width=3)
         cursor += 60
-        
+
         # Diária
         draw.text((W/2, cursor), "POR PESSOA / DIA", font=self.font_label, fill='#888888', anchor="mm")
         cursor += 50
         draw.text((W/2, cursor), self.format_money(daily, currency), font=self.font_hero, fill='#1E88E5', anchor="mm")
-        
+
         # Total
         cursor += 120
-        draw.rectangle([(margin+20, cursor), (W-margin-20, cursor+140)], fill='#F5F9FF')
+        draw.rectangle([(MARGIN+20, cursor), (W-MARGIN-20, cursor+140)], fill='#F5F9FF')
         txt_y = cursor + 35
         draw.text((W/2, txt_y), f"TOTAL ({days} DIAS)", font=self.font_label, fill='#555555', anchor="mm")
         draw.text((W/2, txt_y+40), self.format_money(total, currency), font=self.font_url, fill='#333333', anchor="mm")
         draw.text((W/2, txt_y+80), f"Vibe: {vibe.title()}", font=self.font_label, fill='#1E88E5', anchor="mm")
 
-        # 3. RODAPÉ DE GROWTH (Preto com URL amarela/branca)
-        footer_h = 90
-        draw.rectangle([(0, H - footer_h), (W, H)], fill='#212121')
-        draw.text((W/2, H - (footer_h/2)), "Baixe agora: takeitiz.com.br", font=self.font_url, fill='#FFFFFF', anchor="mm")
+        # 3. Rodapé por cima de tudo
+        img.paste(self.footer(), (0, H - FOOTER_H))
+        return img
 
-        buf = io.BytesIO()
-        img.save(buf, format='PNG')
-        buf.seek(0)
-        return buf
+    def create_ticket(self, destination, total, daily, days, vibe, currency):
+        # Valores exibidos com 2 casas: arredonda para a chave do cache bater
+        png = _cached_ticket(destination, round(float(total), 2), round(float(daily), 2), days, vibe, currency)
+        return io.BytesIO(png)
+
+@lru_cache(maxsize=256)
+def _cached_ticket(destination, total, daily, days, vibe, currency):
+    return TicketGenerator().render_png(destination, total, daily, days, vibe, currency)
@@ -0,0 +1,224 @@
+# telemetry.py
+# Contadores e histogramas de latência do pipeline de cotação.
+# Exportados em formato texto do Prometheus para arquivo e/ou endpoint local.
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+# Limites (segundos) dos baldes do histograma: de 0,5 ms a 10 s
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'takeitiz_quotes_total': "Cotações calculadas, por resultado do memo de orçamentos.",
+    'takeitiz_quote_memo_total': "Memo de orçamentos: acertos, faltas e despejos (LRU cheio) desde o início do processo.",
+    'takeitiz_quote_memo_entries': "Orçamentos no memo agora (limite em config.QUOTE_CACHE_SIZE).",
+    'takeitiz_fx_source_total': "Cotações servidas por fonte de câmbio.",
+    'takeitiz_geo_path_total': "Destinos resolvidos por caminho (cidade, fuzzy, gazetteer, geocode, padrão).",
+    'takeitiz_geocode_cache_total': "Consultas ao cache de geocodificação por resultado.",
+    'takeitiz_cache_total': "Consultas ao cache em camadas por namespace, camada e resultado.",
+    'takeitiz_autocomplete_total': "Consultas ao autocompletar que estouraram o orçamento por tecla.",
+    'takeitiz_destinations_reloads_total': "Recargas da base de destinos por resultado (ok, invalid).",
+    'takeitiz_price_grid_builds_total': "Montagens da tabela de preços pré-compilada (carga e mudanças na base).",
+    'takeitiz_rankings_total': "Rankings de destinos por orçamento, por modo.",
+    'takeitiz_defaulted_total': "Provedores que estouraram o prazo da cotação e usaram o padrão.",
+    'takeitiz_circuit_transitions_total': "Mudanças de estado dos circuit breakers por upstream (closed, open, half_open).",
+    'takeitiz_circuit_rejected_total': "Chamadas puladas na hora por circuito aberto, por upstream.",
+    'takeitiz_hedged_total': "Requisições com hedge por resultado (primary, primary_hedged, backup, failed).",
+    'takeitiz_profiles_total': "Requisições perfiladas por chamada e resultado (saved, fast).",
+    'takeitiz_suppressed_errors_total': "Exceções engolidas pelas cadeias de fallback.",
+    'takeitiz_stage_seconds': "Duração de cada etapa do pipeline.",
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _fmt_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    inner = ",".join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # nome -> {labels: valor}
+        self._histograms = {}  # nome -> {labels: [contagens por balde..., soma, total]}
+        self._collectors = []  # fn() -> [(nome, tipo, {labels}, valor)], lidos a cada exportação
+
+    def inc(self, name, amount=1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+                    break
+            h[-2] += seconds
+            h[-1] += 1
+
+    def add_collector(self, fn):
+        with self._lock:
+            self._collectors.append(fn)
+
+    def _collect(self):
+        """{(nome, tipo): {labels: valor}} dos coletores (fora do lock: um coletor pode contar erro)."""
+        with self._lock:
+            collectors = list(self._collectors)
+        samples = {}
+        for fn in collectors:
+            try:
+                for name, kind, labels, value in fn():
+                    samples.setdefault((name, kind), {})[_labels_key(labels)] = value
+            except Exception as exc:
+                suppressed('telemetry.collector', exc)
+        return samples
+
+    def render(self):
+        """Snapshot no formato de exposição texto do Prometheus (0.0.4)."""
+        lines = []
+        collected = self._collect()
+        for (name, kind), series in sorted(collected.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_fmt_labels(key)} {value}")
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_fmt_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, h):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_fmt_labels(key, [('le', repr(bound))])} {cumulative}")
+                    lines.append(f"{name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {h[-1]}")
+                    lines.append(f"{name}_sum{_fmt_labels(key)} {h[-2]:.6f}")
+                    lines.append(f"{name}_count{_fmt_labels(key)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+REGISTRY = Registry()
+
+
+def count(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+
+def add_collector(fn):
+    """
+    Métricas lidas na hora da exportação, sem custo no caminho da requisição:
+    fn() devolve [(nome, 'counter' ou 'gauge', {labels}, valor)] (ex: estatísticas de um cache).
+    """
+    REGISTRY.add_collector(fn)
+
+
+@contextmanager
+def stage(name, audit=None):
+    """
+    Cronometra uma etapa; grava no histograma e, se houver, no audit da cotação.
+    O dict entregue pelo `with` vira a entrada do audit (o chamador pode completar).
+    """
+    entry = {'stage': name}
+    t0 = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        elapsed = time.perf_counter() - t0
+        REGISTRY.observe('takeitiz_stage_seconds', elapsed, stage=name)
+        if audit is not None:
+            entry['ms'] = round(elapsed * 1000, 3)
+            audit.append(entry)
+
+
+def suppressed(where, exc, audit=None):
+    """Registra uma exceção que a cadeia de fallback vai engolir (antes era um `except: pass` mudo)."""
+    logging.warning("%s: %s: %s", where, type(exc).__name__, exc)
+    REGISTRY.inc('takeitiz_suppressed_errors_total', where=where, type=type(exc).__name__)
+    if audit is not None:
+        audit.append({'stage': where, 'error': f"{type(exc).__name__}: {exc}"})
+
+
+# --- EXPORTADORES ---
+def write_file(path):
+    # Escrita atômica: o coletor (node_exporter textfile, etc.) nunca lê arquivo pela metade
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        fh.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def start_exporters():
+    """Liga os exportadores configurados em config.py (idempotente)."""
+    global _started
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+
+    if config.TELEMETRY_PORT:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", config.TELEMETRY_PORT), _MetricsHandler)
+        except OSError as exc:
+            # Outra réplica/worker na mesma máquina já expõe a porta
+            logging.warning("Telemetria: porta %s indisponível (%s)", config.TELEMETRY_PORT, exc)
+        else:
+            threading.Thread(target=server.serve_forever, daemon=True, name="takeitiz-metrics").start()
+
+    if config.TELEMETRY_FILE:
+        def flush_loop():
+            while True:
+                time.sleep(config.TELEMETRY_FLUSH_SECONDS)
+                try:
+                    write_file(config.TELEMETRY_FILE)
+                except OSError:
+                    logging.exception("Telemetria: falha ao gravar %s", config.TELEMETRY_FILE)
+        threading.Thread(target=flush_loop, daemon=True, name="takeitiz-metrics-file").start()
@@ -0,0 +1,238 @@
+# ticketbatch.py
+# Geração em lote dos tickets de compartilhamento (share.TicketGenerator) para campanhas.
+#
+# Uso:
+#   python ticketbatch.py -o tickets/                               # base inteira, 7 dias, BRL, PNG com paleta
+#   python ticketbatch.py -o campanha.zip --format webp --quality 75
+#   python ticketbatch.py cotacoes.csv -o tickets/ --format png     # saída do quotebatch.py (ou CSV/JSONL próprio)
+#
+# Sem arquivo de entrada, cada cidade da base é cotada pelo CostEngine com --days/--travelers/--style/
+# --vibe/--currency/--start-date. Com arquivo, usa as colunas destination, total, daily_avg (ou daily),
+# days, vibe e currency.
+#
+# A renderização roda num pool de processos (fontes, fundo e paleta prontos uma vez por worker);
+# o processo principal grava na pasta ou no .zip e escreve manifest.csv com tamanho e tempo
+# de cada imagem.
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import quotebatch
+import share
+from matcher import normalize
+
+MANIFEST_COLUMNS = ["file", "destination", "bytes", "render_ms", "encode_ms"]
+
+
+# --- 1. TICKETS A GERAR ---
+def read_tickets(path):
+    """
+    Tickets de um CSV/JSONL (ex: saída do quotebatch.py). Linhas com erro da cotação são ignoradas;
+    linhas ilegíveis (JSON quebrado, sem destino ou diária, números/datas inválidos) vão para `skipped`.
+    Devolve (tickets, [(linha, motivo)]).
+    """
+    with open(path, encoding="utf-8", newline="") as fh:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(fh))
+        else:
+            rows = [line for line in fh if line.strip()]
+    tickets, skipped = [], []
+    for i, rec in enumerate(rows):
+        try:
+            if not isinstance(rec, dict):
+                rec = json.loads(rec)
+            if rec.get("error") or rec.get("total") in (None, ""):
+                continue
+            days = quotebatch.parse_trip(rec)[1]  # days ou start_date/end_date, como na cotação
+            daily = rec.get("daily_avg") or rec.get("daily")
+            if daily in (None, ""):
+                raise ValueError("sem daily_avg/daily")
+            tickets.append((rec["destination"], float(rec["total"]), float(daily),
+                            days, rec.get("vibe") or "tourist_mix", rec.get("currency") or "BRL"))
+        except (ValueError, TypeError, AttributeError) as exc:
+            skipped.append((i, str(exc)))
+    return tickets, skipped
+
+
+def price_catalog(days, travelers, style, vibe, currency, start_date):
+    """Um ticket por cidade da base (sem apelidos), cotado pelo CostEngine."""
+    import destdb
+    import engine
+    eng = engine.engine
+    tickets = []
+    for key, data in destdb.current().cities.items():
+        if data.get("alias_of"):
+            continue
+        name = data.get("name") or key
+        res = eng.calculate_cost(name, days, travelers, style, currency, vibe, start_date, seasonality="nightly")
+        tickets.append((name, res["total"], res["daily_avg"], days, vibe, currency))
+    return tickets
+
+
+# --- 2. WORKERS ---
+_GEN = None
+
+
+def _generator():
+    global _GEN
+    if _GEN is None:
+        _GEN = share.TicketGenerator()
+    return _GEN
+
+
+def render_chunk(task):
+    """Renderiza e codifica um bloco. Devolve [(destino, bytes, ms de desenho, ms de codificação)]."""
+    tickets, encoding = task
+    gen = _generator()
+    out = []
+    for ticket in tickets:
+        t0 = time.perf_counter()
+        img = gen.render_image(*ticket)
+        t1 = time.perf_counter()
+        data = gen.encode(img, **encoding)
+        t2 = time.perf_counter()
+        out.append((ticket[0], data, (t1 - t0) * 1000, (t2 - t1) * 1000))
+    return out
+
+
+def render(tickets, encoding, workers, chunk_size, window):
+    """Gera os resultados na ordem de entrada; workers=0 roda no próprio processo."""
+    tasks = [(tickets[i:i + chunk_size], encoding) for i in range(0, len(tickets), chunk_size)]
+    if workers == 0:
+        for task in tasks:
+            yield from render_chunk(task)
+        return
+    # spawn: o worker só carrega share/PIL, sem herdar engine, threads e conexões do pai
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(render_chunk, task))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+# --- 3. SAÍDA (PASTA OU ZIP) ---
+class Output:
+    """Grava arquivos numa pasta ou num .zip (imagens já comprimidas: ZIP_STORED)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = None
+        self._names = set()
+        if path.endswith(".zip"):
+            self._tmp = f"{path}.tmp"
+            self.zip = zipfile.ZipFile(self._tmp, "w", compression=zipfile.ZIP_STORED)
+        else:
+            os.makedirs(path, exist_ok=True)
+
+    def unique_name(self, destination, ext):
+        slug = re.sub(r"[^a-z0-9]+", "-", normalize(destination)).strip("-") or "destino"
+        name, n = f"takeitiz_{slug}.{ext}", 1
+        while name in self._names:
+            n += 1
+            name = f"takeitiz_{slug}-{n}.{ext}"
+        self._names.add(name)
+        return name
+
+    def write(self, name, data):
+        if self.zip is not None:
+            self.zip.writestr(name, data)
+        else:
+            with open(os.path.join(self.path, name), "wb") as fh:
+                fh.write(data)
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+            os.replace(self._tmp, self.path)  # o .zip só aparece completo
+
+    def abort(self):
+        """Falhou no meio: descarta o .zip.tmp (um .zip anterior, se houver, fica intacto)."""
+        if self.zip is not None:
+            self.zip.close()
+            os.remove(self._tmp)
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera tickets de compartilhamento em lote")
+    parser.add_argument("input", nargs="?", help="CSV/JSONL de cotações (padrão: cota a base inteira)")
+    parser.add_argument("-o", "--out", required=True, help="pasta de saída ou arquivo .zip")
+    parser.add_argument("--format", choices=list(share.FORMATS), default="png8")
+    parser.add_argument("--quality", type=int, default=None, help=f"WebP (padrão {share.WEBP_QUALITY})")
+    parser.add_argument("--compress-level", type=int, default=None, choices=range(10), metavar="0-9", help="PNG/zlib")
+    parser.add_argument("--colors", type=int, default=None, help=f"cores da paleta png8 (padrão {share.PALETTE_COLORS})")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--travelers", type=int, default=2)
+    parser.add_argument("--style", default="moderado")
+    parser.add_argument("--vibe", default="tourist_mix")
+    parser.add_argument("--currency", default="BRL")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=None, help="AAAA-MM-DD")
+    parser.add_argument("--workers", type=int, default=None, help="processos (0 = sem pool; padrão: núcleos)")
+    parser.add_argument("--chunk", type=int, default=16, help="tickets por tarefa")
+    args = parser.parse_args(argv)
+
+    workers = (os.cpu_count() or 1) if args.workers is None else args.workers
+    encoding = {"fmt": args.format, "quality": args.quality, "compress_level": args.compress_level, "colors": args.colors}
+    ext = share.FORMATS[args.format]["ext"]
+
+    t0 = time.perf_counter()
+    if args.input:
+        tickets, skipped = read_tickets(args.input)
+        if skipped:
+            print(f"   {len(skipped)} linhas ignoradas: " + "; ".join(f"linha {i}: {why}" for i, why in skipped[:5])
+                  + (" ..." if len(skipped) > 5 else ""), file=sys.stderr)
+    else:
+        tickets = price_catalog(args.days, args.travelers, args.style, args.vibe, args.currency, args.start_date)
+    t_prices = time.perf_counter() - t0
+
+    out = Output(args.out)
+    manifest = io.StringIO()
+    writer = csv.writer(manifest, lineterminator="\n")
+    writer.writerow(MANIFEST_COLUMNS)
+    sizes, render_ms, encode_ms = [], [], []
+    try:
+        for destination, data, r_ms, e_ms in render(tickets, encoding, workers, args.chunk, max(2, 2 * workers)):
+            name = out.unique_name(destination, ext)
+            out.write(name, data)
+            writer.writerow([name, destination, len(data), f"{r_ms:.2f}", f"{e_ms:.2f}"])
+            sizes.append(len(data))
+            render_ms.append(r_ms)
+            encode_ms.append(e_ms)
+        out.write("manifest.csv", manifest.getvalue().encode("utf-8"))
+    except BaseException:
+        out.abort()
+        raise
+    out.close()
+
+    elapsed = time.perf_counter() - t0
+    n = len(sizes)
+    if n:
+        print(f"   {args.format}: {sum(sizes) / 1024:.0f} KiB no total, {sum(sizes) / n / 1024:.1f} KiB por imagem "
+              f"(máx {max(sizes) / 1024:.1f} KiB)", file=sys.stderr)
+        print(f"   por imagem: desenho p50 {_percentile(render_ms, 0.5):.1f} ms, codificação p50 "
+              f"{_percentile(encode_ms, 0.5):.1f} ms / p95 {_percentile(encode_ms, 0.95):.1f} ms", file=sys.stderr)
+    print(f"✅ {n} tickets em {elapsed:.2f} s ({n / elapsed if elapsed else 0:.0f}/s, cotação {t_prices:.2f} s, "
+          f"{workers} workers) -> {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# warmup.py
+# Partida a frio controlada: relatório de tempo de import + aquecimento antes de servir.
+#
+# Uso:
+#   python warmup.py                                  # relatório de imports + warm-up
+#   python warmup.py --max-import-seconds 1.5         # falha (exit 1) se os imports passarem do orçamento
+#   python warmup.py --serve -- --server.port=8501    # aquece e sobe o Streamlit NO MESMO processo
+#
+# Com --serve o app.py reaproveita os módulos já carregados (sys.modules), então o
+# primeiro usuário depois de um deploy/autoscale encontra câmbio, fontes e índices prontos.
+# O servidor (e o /_stcore/health) só sobe depois do aquecimento.
+
+import argparse
+import importlib
+import logging
+import sys
+import time
+
+# Ordem importa: cada linha mede só o que ainda não tinha sido carregado
+HEAVY_MODULES = [
+    "numpy", "PIL.Image", "requests", "geopy.geocoders", "yfinance",
+]
+APP_MODULES = [
+    "config", "destdb", "database", "matcher", "autocomplete", "gazetteer", "cache", "telemetry", "profiler", "resilience", "geocache",
+    "engine", "amenities", "share",
+]
+
+WARM_CURRENCIES = ("BRL", "EUR")  # a cesta inteira (config.FX_CURRENCIES) vem na mesma coleta
+
+
+def import_report(modules=None):
+    """[(módulo, segundos)] do import incremental de cada módulo."""
+    report = []
+    for name in modules or (HEAVY_MODULES + APP_MODULES):
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as exc:
+            logging.warning("warm-up: %s indisponível (%s)", name, exc)
+            continue
+        report.append((name, time.perf_counter() - t0))
+    return report
+
+
+def warm_up(currencies=WARM_CURRENCIES, fx_timeout=10.0):
+    """Pré-carrega câmbio, índices, NumPy, fontes e templates. Devolve [(etapa, segundos)]."""
+    import engine
+    import gazetteer
+    import share
+    import amenities
+    from datetime import date
+
+    steps = []
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception:
+            logging.exception("warm-up: etapa %s falhou", name)
+        steps.append((name, time.perf_counter() - t0))
+
+    eng = engine.engine
+
+    def fx():
+        for cur in currencies:
+            quote = eng.fx.store.prefetch(cur, fx_timeout)
+            logging.info("warm-up: câmbio %s = %s (%s)", cur, quote and round(quote.rate, 4), quote and quote.source)
+
+    step("fx", fx)
+    step("engine.price_grid", lambda: logging.info("warm-up: tabela de preços %s", eng.grid.memory_report()))
+    step("gazetteer", lambda: gazetteer.resolve("toscana"))
+    step("geo.geolocator", lambda: eng.geo.geolocator)
+    # Primeira cotação exercita NumPy (sazonalidade) e o pool de provedores
+    step("engine.quote", lambda: eng.calculate_cost("Paris", 7, 2, "moderado", "USD", "tourist_mix", date.today(), "nightly"))
+    step("share.fonts", lambda: share.TicketGenerator().background())
+    step("share.render", lambda: share.TicketGenerator().render_png("Takeitiz", 1000.0, 100.0, 5, "tourist_mix", "BRL"))
+    step("amenities", lambda: amenities.AmenitiesGenerator().generate_concierge_links("Paris", "moderado", date.today(), 5))
+    return steps
+
+
+def _print_table(title, rows):
+    total = sum(sec for _, sec in rows)
+    print(f"\n{title}")
+    for name, sec in rows:
+        print(f"  {name:<22}{sec * 1000:>9.1f} ms")
+    print(f"  {'TOTAL':<22}{total * 1000:>9.1f} ms")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório de imports e aquecimento do Takeitiz")
+    parser.add_argument("--max-import-seconds", type=float, default=None,
+                        help="falha se a soma dos imports passar deste orçamento")
+    parser.add_argument("--fx-timeout", type=float, default=10.0)
+    parser.add_argument("--skip-warmup", action="store_true")
+    parser.add_argument("--serve", action="store_true", help="sobe o Streamlit (app.py) após aquecer")
+    parser.add_argument("streamlit_args", nargs="*", help="argumentos repassados ao streamlit run (após --)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    t0 = time.perf_counter()
+    import_total = _print_table("Imports (incremental)", import_report())
+
+    if not args.skip_warmup:
+        _print_table("Warm-up", warm_up(fx_timeout=args.fx_timeout))
+    print(f"\nPronto em {time.perf_counter() - t0:.2f} s", flush=True)
+
+    if args.max_import_seconds is not None and import_total > args.max_import_seconds:
+        print(f"❌ Imports levaram {import_total:.2f} s (orçamento {args.max_import_seconds:.2f} s)")
+        return 1
+
+    if args.serve:
+        from streamlit.web import cli as stcli
+        sys.argv = ["streamlit", "run", "app.py"] + args.streamlit_args
+        return stcli.main()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())